@@ -0,0 +1,279 @@
+import io
+import logging
+import threading
+import time
+from collections import OrderedDict
+from db import connect, queue_write, flush_actions
+from timing import timed
+
+FOLLOWING_TTL = 6 * 60 * 60  # Seconds before checking for newly followed accounts
+FOLLOWING_FULL_TTL = 7 * 24 * 60 * 60  # Seconds before re-downloading the whole list (picks up unfollows)
+FOLLOWING_REFRESH_AMOUNT = 200  # Most recent follows fetched by an incremental refresh
+PROFILE_TTL = 24 * 60 * 60  # Seconds an author profile is reused before fetching it again
+PROFILE_CACHE_SIZE = 1000  # Profiles kept in memory (least recently used are evicted)
+VISION_CACHE_TTL = 30 * 24 * 60 * 60  # Seconds a vision analysis is reused
+
+class FollowingCache:
+    """Set of user pks the logged-in account follows, fetched once and persisted in SQLite.
+
+    Instagram returns the following list newest first, so between full downloads
+    only the first FOLLOWING_REFRESH_AMOUNT entries are fetched and merged in.
+    """
+
+    def __init__(self, ttl=FOLLOWING_TTL, full_ttl=FOLLOWING_FULL_TTL, refresh_amount=FOLLOWING_REFRESH_AMOUNT):
+        self.ttl = ttl
+        self.full_ttl = full_ttl
+        self.refresh_amount = refresh_amount
+        self._owner_pk = None
+        self._following = set()
+        self._refreshed_at = 0
+        self._full_refreshed_at = 0
+        self._failed_at = 0  # Last failed download; no retries (full or recent) until ttl has passed
+        self._lock = threading.Lock()
+
+    def is_following(self, cl, user_pk):
+        """Return True if the logged-in user follows user_pk"""
+        with self._lock:
+            self._ensure_fresh(cl)
+            return int(user_pk) in self._following
+
+    def _ensure_fresh(self, cl):
+        owner_pk = int(cl.user_id)
+        if owner_pk != self._owner_pk:
+            self._load(owner_pk)
+        now = int(time.time())
+        if now - self._failed_at < self.ttl:
+            return
+        try:
+            if now - self._full_refreshed_at >= self.full_ttl:
+                with timed('user_following'):
+                    following = cl.user_following(cl.user_id, use_cache=False)
+                self._following = {int(pk) for pk in following.keys()}
+                self._full_refreshed_at = now
+                self._refreshed_at = now
+                self._save(replace=True)
+                logging.info(f"Downloaded following list ({len(self._following)} accounts).")
+            elif now - self._refreshed_at >= self.ttl:
+                with timed('user_following'):
+                    recent = cl.user_following(cl.user_id, use_cache=False, amount=self.refresh_amount)
+                added = {int(pk) for pk in recent.keys()} - self._following
+                self._following |= added
+                self._refreshed_at = now
+                self._save(added=added)
+                logging.info(f"Refreshed following list: {len(added)} new accounts.")
+        except Exception as e:
+            # Keep using what we have; don't retry on every post
+            logging.warning(f"Could not refresh following list, using cached copy: {e}")
+            self._failed_at = now
+
+    def _load(self, owner_pk):
+        self._owner_pk = owner_pk
+        self._failed_at = 0
+        conn = connect()
+        try:
+            c = conn.cursor()
+            c.execute('SELECT user_pk FROM following WHERE owner_pk=?', (owner_pk,))
+            self._following = {row[0] for row in c.fetchall()}
+            c.execute('SELECT refreshed_at, full_refreshed_at FROM following_meta WHERE owner_pk=?', (owner_pk,))
+            row = c.fetchone()
+            self._refreshed_at, self._full_refreshed_at = row if row else (0, 0)
+        finally:
+            conn.close()
+
+    def _save(self, replace=False, added=()):
+        conn = connect()
+        try:
+            with conn:
+                if replace:
+                    conn.execute('DELETE FROM following WHERE owner_pk=?', (self._owner_pk,))
+                    added = self._following
+                conn.executemany(
+                    'INSERT OR IGNORE INTO following (owner_pk, user_pk) VALUES (?, ?)',
+                    [(self._owner_pk, pk) for pk in added]
+                )
+                conn.execute(
+                    'INSERT OR REPLACE INTO following_meta (owner_pk, refreshed_at, full_refreshed_at) VALUES (?, ?, ?)',
+                    (self._owner_pk, self._refreshed_at, self._full_refreshed_at)
+                )
+        finally:
+            conn.close()
+
+following_cache = FollowingCache()
+
+class ProfileCache:
+    """Bounded LRU cache of author profiles with expiry, backed by the user_profiles table.
+
+    Only the fields get_media_details needs are kept. Lookups try memory, then
+    SQLite, and only then cl.user_info; hits and misses are counted for the stats window.
+    """
+
+    def __init__(self, ttl=PROFILE_TTL, max_size=PROFILE_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._profiles = OrderedDict()  # pk -> (profile dict, fetched_at)
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def get(self, cl, user_pk):
+        """Return {'username', 'full_name'} for user_pk, fetching it only on a miss"""
+        pk = int(user_pk)
+        now = int(time.time())
+        with self._lock:
+            entry = self._profiles.get(pk)
+            if entry and now - entry[1] < self.ttl:
+                self._profiles.move_to_end(pk)
+                self.memory_hits += 1
+                return entry[0]
+        entry = self._load(pk)
+        if entry and now - entry[1] < self.ttl:
+            with self._lock:
+                self.db_hits += 1
+                self._remember(pk, entry)
+            return entry[0]
+        with timed('user_info'):
+            user = cl.user_info(user_pk)
+        profile = {'username': user.username, 'full_name': user.full_name}
+        with self._lock:
+            self.misses += 1
+            self._remember(pk, (profile, now))
+        queue_write(
+            'INSERT OR REPLACE INTO user_profiles (pk, username, full_name, fetched_at) VALUES (?, ?, ?, ?)',
+            (pk, profile['username'], profile['full_name'], now)
+        )
+        return profile
+
+    def stats(self):
+        """Counters for this session: memory hits, SQLite hits, misses and overall hit rate"""
+        with self._lock:
+            hits = self.memory_hits + self.db_hits
+            total = hits + self.misses
+            return {
+                'memory_hits': self.memory_hits,
+                'db_hits': self.db_hits,
+                'misses': self.misses,
+                'hit_rate': hits / total if total else 0.0,
+            }
+
+    def _remember(self, pk, entry):
+        self._profiles[pk] = entry
+        self._profiles.move_to_end(pk)
+        while len(self._profiles) > self.max_size:
+            self._profiles.popitem(last=False)
+
+    def _load(self, pk):
+        conn = connect()
+        try:
+            row = conn.execute(
+                'SELECT username, full_name, fetched_at FROM user_profiles WHERE pk=?', (pk,)
+            ).fetchone()
+        finally:
+            conn.close()
+        if not row:
+            return None
+        return {'username': row[0], 'full_name': row[1]}, row[2]
+
+profile_cache = ProfileCache()
+
+def image_hash(image_bytes):
+    """64-bit difference hash of an image as 16 hex chars; visually identical images share it.
+    Returns None for flat images, which would otherwise all share one hash."""
+    from PIL import Image
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        small = img.convert('L').resize((9, 8))
+        pixels = list(small.getdata())
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            bits = (bits << 1) | (left > right)
+    if bits == 0:
+        return None  # Flat images (all one colour) have no usable fingerprint
+    return f"{bits:016x}"
+
+class VisionCache:
+    """Persistent cache of vision results (safe/sensitive plus description).
+
+    Entries are found by media id first, then by perceptual image hash so
+    reposts of the same picture are not analyzed again. Entries older than
+    ttl are ignored and removed by purge().
+    """
+
+    def __init__(self, ttl=VISION_CACHE_TTL):
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, media_id=None, image_hash=None):
+        """Return {'sensitive', 'description'} for a cached analysis, or None"""
+        since = int(time.time()) - self.ttl
+        conn = connect()
+        try:
+            row = None
+            if media_id is not None:
+                row = conn.execute(
+                    'SELECT sensitive, description FROM vision_cache WHERE media_id=? AND created_at>=? '
+                    'ORDER BY created_at DESC LIMIT 1', (str(media_id), since)
+                ).fetchone()
+            if row is None and image_hash:
+                row = conn.execute(
+                    'SELECT sensitive, description FROM vision_cache WHERE image_hash=? AND created_at>=? '
+                    'ORDER BY created_at DESC LIMIT 1', (image_hash, since)
+                ).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return {'sensitive': bool(row[0]), 'description': row[1]}
+
+    def put(self, media_id, image_hash, sensitive, description):
+        """Record the result of a vision analysis"""
+        queue_write(
+            'INSERT INTO vision_cache (media_id, image_hash, sensitive, description, created_at) VALUES (?, ?, ?, ?, ?)',
+            (None if media_id is None else str(media_id), image_hash, int(bool(sensitive)), description, int(time.time()))
+        )
+
+    def entries(self, limit=50, media_id=None, image_hash=None):
+        """Most recent cached analyses as dicts, optionally for one media id or image hash"""
+        flush_actions()
+        query = 'SELECT media_id, image_hash, sensitive, description, created_at FROM vision_cache'
+        clauses, params = [], []
+        if media_id is not None:
+            clauses.append('media_id=?')
+            params.append(str(media_id))
+        if image_hash:
+            clauses.append('image_hash=?')
+            params.append(image_hash)
+        if clauses:
+            query += ' WHERE ' + ' AND '.join(clauses)
+        query += ' ORDER BY created_at DESC LIMIT ?'
+        params.append(limit)
+        conn = connect()
+        try:
+            rows = conn.execute(query, params).fetchall()
+        finally:
+            conn.close()
+        keys = ('media_id', 'image_hash', 'sensitive', 'description', 'created_at')
+        return [dict(zip(keys, row)) for row in rows]
+
+    def purge(self, older_than=None, media_id=None):
+        """Delete entries older than older_than seconds (default: the TTL), or every entry
+        for media_id. Returns the number of rows removed."""
+        flush_actions()
+        conn = connect()
+        try:
+            with conn:
+                if media_id is not None:
+                    cur = conn.execute('DELETE FROM vision_cache WHERE media_id=?', (str(media_id),))
+                else:
+                    max_age = self.ttl if older_than is None else older_than
+                    cur = conn.execute('DELETE FROM vision_cache WHERE created_at<?', (int(time.time()) - max_age,))
+            return cur.rowcount
+        finally:
+            conn.close()
+
+vision_cache = VisionCache()
@@ -1,12 +1,235 @@
+import atexit
+import hashlib
+import logging
+import queue
+import re
 import sqlite3
-from datetime import datetime
+import threading
+import time
+from datetime import datetime, timezone
 
 DB_PATH = 'instabot.db'
+BUSY_TIMEOUT_MS = 5000  # How long a connection waits on a locked database
+FLUSH_INTERVAL = 0.5  # Seconds the writer collects rows before committing a batch
+MAX_BATCH = 200  # Upper bound on rows committed in a single transaction
+FLUSH_TIMEOUT = 10  # Longest a reader waits in flush_actions() for queued rows
+# SQLite errors that go away on their own; batches failing with them are retried whole
+TRANSIENT_ERRORS = ('database is locked', 'database table is locked', 'database is busy')
 
-def init_db():
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    # Add post_link column if it doesn't exist
+# Row of the timings table (see timing.py): ts, stage, duration_ms, ok
+TIMING_INSERT = 'INSERT INTO timings (ts, stage, duration_ms, ok) VALUES (?, ?, ?, ?)'
+
+def connect(path=None):
+    """Open a connection with WAL journaling and a busy timeout, so the bot thread,
+    the stats window and print_errors.py can share the database without lock errors"""
+    conn = sqlite3.connect(path or DB_PATH, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+    conn.execute(f'PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}')
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')  # Durable across app crashes; WAL fsyncs on checkpoint
+    return conn
+
+def _is_transient(error):
+    return isinstance(error, sqlite3.OperationalError) and any(m in str(error) for m in TRANSIENT_ERRORS)
+
+class ActionWriter:
+    """Long-lived writer that commits queued inserts in batches from a background thread.
+
+    Statements are queued as (sql, params) pairs and committed together every
+    FLUSH_INTERVAL seconds, or as soon as MAX_BATCH rows are waiting. flush() blocks
+    until everything queued so far is on disk, and close() drains the queue on exit.
+    """
+
+    def __init__(self, path=None, flush_interval=FLUSH_INTERVAL, max_batch=MAX_BATCH):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def submit(self, sql, params):
+        """Queue a statement for the next batch"""
+        if self._closed:
+            # After shutdown fall back to a direct write rather than dropping the row
+            self._write([(sql, params)])
+            return
+        self._ensure_started()
+        self._queue.put((sql, params))
+
+    def flush(self, timeout=None):
+        """Block until every statement queued before this call has been committed.
+        Returns False if timeout seconds passed first."""
+        if self._closed:
+            return True
+        if self._queue.empty() and (self._thread is None or not self._thread.is_alive()):
+            return True
+        self._ensure_started()
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def close(self):
+        """Stop the writer thread and commit anything still queued"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=10)
+        # Whatever the thread could not commit (or if it died) is written here
+        self._write(self._drain())
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="ActionWriter", daemon=True)
+                self._thread.start()
+
+    def _drain(self):
+        pending = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return pending
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is not None:
+                pending.append(item)
+
+    def _run(self):
+        conn = connect(self.path)
+        pending = []  # Rows not committed yet, including ones that hit a busy database
+        waiters = []  # flush() callers, released once everything queued before them is committed
+        retry_delay = self.flush_interval
+        try:
+            stop = False
+            while not stop:
+                # With rows left over from a busy database, wake up to retry them instead
+                # of waiting for new input
+                try:
+                    item = self._queue.get(timeout=retry_delay if pending else None)
+                except queue.Empty:
+                    item = ()
+                stop = item is None
+                if isinstance(item, threading.Event):
+                    waiters.append(item)
+                elif item:
+                    pending.append(item)
+                deadline = time.monotonic() + self.flush_interval
+                # Keep collecting until the interval passes, the batch is full or someone waits on it
+                while not stop and not waiters and len(pending) < self.max_batch:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        stop = True
+                    elif isinstance(item, threading.Event):
+                        waiters.append(item)
+                    else:
+                        pending.append(item)
+                try:
+                    if pending:
+                        pending = self._commit(conn, pending)
+                except Exception as e:
+                    # Never let a batch kill the thread: flush() callers would wait forever
+                    logging.error(f"Dropped {len(pending)} queued database rows: {e}")
+                    pending = []
+                if pending:
+                    # Database busy: back off, and keep the waiters until the rows are in
+                    # (flush() gives up on its own after its timeout)
+                    retry_delay = min(retry_delay * 2, BUSY_TIMEOUT_MS / 1000)
+                    continue
+                retry_delay = self.flush_interval
+                for waiter in waiters:
+                    waiter.set()
+                waiters = []
+        finally:
+            if pending:
+                # Hand uncommitted rows back so close() can retry them
+                for row in pending:
+                    self._queue.put(row)
+            for waiter in waiters:
+                waiter.set()
+            conn.close()
+
+    def _commit(self, conn, rows):
+        """Commit rows in one transaction and return the rows to retry later: none on success,
+        all of them if the database is busy. Otherwise the rows are retried one at a time and
+        the ones that still fail are logged and dropped, so a bad row can't block the rest."""
+        try:
+            self._execute(conn, rows)
+            return []
+        except Exception as e:
+            if _is_transient(e):
+                logging.warning(f"Database busy, will retry {len(rows)} queued rows: {e}")
+                return rows
+            if len(rows) == 1:
+                logging.error(f"Dropped queued database row {rows[0]!r}: {e}")
+                return []
+            logging.error(f"Failed to commit {len(rows)} queued database rows, retrying one at a time: {e}")
+        retry = []
+        for row in rows:
+            try:
+                self._execute(conn, [row], record_time=False)
+            except Exception as e:
+                if _is_transient(e):
+                    retry.append(row)
+                else:
+                    logging.error(f"Dropped queued database row {row!r}: {e}")
+        return retry
+
+    def _execute(self, conn, rows, record_time=True):
+        with conn:
+            start = time.perf_counter()
+            for sql, params in rows:
+                conn.execute(sql, params)
+            if record_time:
+                self._record_batch_time(conn, time.perf_counter() - start)
+
+    def _record_batch_time(self, conn, seconds):
+        # Written in the same transaction, not queued, so it doesn't cause another batch
+        try:
+            conn.execute(TIMING_INSERT, (int(time.time()), 'db_write', seconds * 1000, 1))
+        except sqlite3.Error:
+            pass  # timings table not created yet
+
+    def _write(self, rows):
+        if not rows:
+            return
+        conn = connect(self.path)
+        try:
+            lost = self._commit(conn, rows)
+            if lost:
+                logging.error(f"Database still busy, {len(lost)} queued rows were not written")
+        finally:
+            conn.close()
+
+_writer = ActionWriter()
+atexit.register(_writer.close)
+
+def flush_actions(timeout=FLUSH_TIMEOUT):
+    """Wait until all queued log_action rows are committed, or at most timeout seconds
+    so a reader never hangs on a stuck writer (it then reads without the newest rows).
+    Returns False if the rows were not committed in time."""
+    if _writer.flush(timeout):
+        return True
+    logging.warning(f"Queued database rows not committed after {timeout}s; reading without them")
+    return False
+
+def queue_write(sql, params):
+    """Queue a statement on the batched writer, for hot-path writes that can lag a little"""
+    _writer.submit(sql, params)
+
+def _create_actions_table(c):
     c.execute('''CREATE TABLE IF NOT EXISTS actions (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         timestamp TEXT NOT NULL,
@@ -17,28 +240,433 @@ def init_db():
         error TEXT,
         post_link TEXT
     )''')
-    # Try to add post_link column if missing (for existing DBs)
-    try:
+    # Databases created before post_link existed need the column added
+    columns = [row[1] for row in c.execute('PRAGMA table_info(actions)')]
+    if 'post_link' not in columns:
         c.execute('ALTER TABLE actions ADD COLUMN post_link TEXT')
-    except sqlite3.OperationalError:
-        pass  # Column already exists
-    conn.commit()
-    conn.close()
 
-def log_action(action_type, media_id=None, hashtag=None, comment=None, error=None, post_link=None):
-    conn = sqlite3.connect(DB_PATH)
+# Parts of an error message that vary between occurrences of the same failure
+_ERROR_NOISE = [
+    (re.compile(r'(https?://|www\.)[^\s\'"<>()\[\]{}]+'), '<url>'),
+    (re.compile(r'\b[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\b', re.I), '<id>'),
+    (re.compile(r'\b(?=[0-9a-f]*\d)[0-9a-f]{12,}\b', re.I), '<id>'),  # Hex ids and tokens
+    (re.compile(r'(?<![\w.])(?=[A-Za-z_-]*\d)[A-Za-z0-9_-]{10,}(?![\w.])'), '<id>'),  # Shortcodes, media ids
+    (re.compile(r'(?<!code: )(?<!status )(?<!HTTP )\b\d+(\.\d+)?\b'), '<n>'),  # Keeps HTTP status codes
+    (re.compile(r'\s+'), ' '),
+]
+ERROR_KIND_UPSERT = '''
+    INSERT INTO error_kinds (fingerprint, message, sample, count, first_seen, last_seen) VALUES (?, ?, ?, 1, ?, ?)
+    ON CONFLICT (fingerprint) DO UPDATE SET
+        count = count + 1,
+        first_seen = MIN(first_seen, excluded.first_seen),
+        last_seen = MAX(last_seen, excluded.last_seen)
+'''
+
+def fingerprint_error(error):
+    """Normalize an error message (urls, ids and numbers stripped) and return
+    (fingerprint, normalized message); errors of the same kind share the fingerprint"""
+    message = str(error).strip()
+    for pattern, replacement in _ERROR_NOISE:
+        message = pattern.sub(replacement, message)
+    message = message.strip()[:500]
+    return hashlib.blake2b(message.encode('utf-8', 'surrogatepass'), digest_size=8).hexdigest(), message
+
+def _add_error_fingerprints(c):
+    c.execute('ALTER TABLE actions ADD COLUMN fingerprint TEXT')
+    c.execute('''CREATE TABLE IF NOT EXISTS error_kinds (
+        fingerprint TEXT PRIMARY KEY,
+        message TEXT NOT NULL,  -- Normalized message shared by the kind
+        sample TEXT,  -- First raw message seen
+        count INTEGER NOT NULL,
+        first_seen INTEGER NOT NULL,
+        last_seen INTEGER NOT NULL
+    )''')
+    # Backfill existing errors in log order, so sample and first_seen are the earliest
+    rows = c.execute('SELECT id, error, ts FROM actions WHERE error IS NOT NULL ORDER BY id').fetchall()
+    for action_id, error, ts in rows:
+        fingerprint, message = fingerprint_error(error)
+        c.execute('UPDATE actions SET fingerprint=? WHERE id=?', (fingerprint, action_id))
+        c.execute(ERROR_KIND_UPSERT, (fingerprint, message, error[:1000], ts, ts))
+    c.execute('CREATE INDEX IF NOT EXISTS idx_actions_fingerprint_ts ON actions (fingerprint, ts)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_error_kinds_count ON error_kinds (count)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_error_kinds_last_seen ON error_kinds (last_seen)')
+
+def _add_actions_fts(c):
+    # Full-text index over comments and errors, reading its content from actions
+    try:
+        c.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS actions_fts USING fts5(
+            comment, error, content='actions', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+        )''')
+    except sqlite3.OperationalError as e:
+        # SQLite built without FTS5; search_actions falls back to LIKE
+        logging.warning(f"Full-text search unavailable, comment/error search will be slower: {e}")
+        return
+    c.execute('''CREATE TRIGGER IF NOT EXISTS trg_actions_fts_insert AFTER INSERT ON actions BEGIN
+        INSERT INTO actions_fts (rowid, comment, error) VALUES (NEW.id, NEW.comment, NEW.error);
+    END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS trg_actions_fts_delete AFTER DELETE ON actions BEGIN
+        INSERT INTO actions_fts (actions_fts, rowid, comment, error) VALUES ('delete', OLD.id, OLD.comment, OLD.error);
+    END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS trg_actions_fts_update AFTER UPDATE OF comment, error ON actions BEGIN
+        INSERT INTO actions_fts (actions_fts, rowid, comment, error) VALUES ('delete', OLD.id, OLD.comment, OLD.error);
+        INSERT INTO actions_fts (rowid, comment, error) VALUES (NEW.id, NEW.comment, NEW.error);
+    END''')
+    c.execute("INSERT INTO actions_fts (actions_fts) VALUES ('rebuild')")
+
+# Schema migrations, applied in order. The database's PRAGMA user_version records how
+# many have run, so each step executes exactly once per database. Only ever append.
+# A step is either a callable taking a cursor or a list of SQL statements.
+MIGRATIONS = [
+    # 1: actions table
+    _create_actions_table,
+    # 2: indexes for duplicate checks, history charts, hashtag stats and error listings
+    [
+        'CREATE INDEX IF NOT EXISTS idx_actions_media_type ON actions (media_id, action_type)',
+        'CREATE INDEX IF NOT EXISTS idx_actions_timestamp ON actions (timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_actions_type_timestamp ON actions (action_type, timestamp)',
+        'CREATE INDEX IF NOT EXISTS idx_actions_hashtag_type ON actions (hashtag, action_type)',
+    ],
+    # 3: persisted following list of the logged-in account (see cache.FollowingCache)
+    [
+        '''CREATE TABLE IF NOT EXISTS following (
+            owner_pk INTEGER NOT NULL,
+            user_pk INTEGER NOT NULL,
+            PRIMARY KEY (owner_pk, user_pk)
+        ) WITHOUT ROWID''',
+        '''CREATE TABLE IF NOT EXISTS following_meta (
+            owner_pk INTEGER PRIMARY KEY,
+            refreshed_at INTEGER NOT NULL,  -- epoch seconds of the last (incremental) refresh
+            full_refreshed_at INTEGER NOT NULL  -- epoch seconds of the last complete download
+        )''',
+    ],
+    # 4: author profiles (see cache.ProfileCache)
+    [
+        '''CREATE TABLE IF NOT EXISTS user_profiles (
+            pk INTEGER PRIMARY KEY,
+            username TEXT,
+            full_name TEXT,
+            fetched_at INTEGER NOT NULL  -- epoch seconds
+        )''',
+    ],
+    # 5: vision safety/description results (see cache.VisionCache)
+    [
+        '''CREATE TABLE IF NOT EXISTS vision_cache (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            media_id TEXT,
+            image_hash TEXT,  -- 64-bit difference hash of the downscaled image, as hex
+            sensitive INTEGER NOT NULL,
+            description TEXT,
+            created_at INTEGER NOT NULL  -- epoch seconds
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_vision_cache_media ON vision_cache (media_id)',
+        'CREATE INDEX IF NOT EXISTS idx_vision_cache_hash ON vision_cache (image_hash)',
+        'CREATE INDEX IF NOT EXISTS idx_vision_cache_created ON vision_cache (created_at)',
+    ],
+    # 6: local copy of Goodreads shelves (see goodreads.refresh_goodreads_books)
+    [
+        '''CREATE TABLE IF NOT EXISTS goodreads_shelves (
+            user_id TEXT NOT NULL,
+            shelf TEXT NOT NULL,
+            books TEXT NOT NULL,  -- JSON list of book dicts, most recently added first
+            updated_at INTEGER NOT NULL,  -- epoch seconds of the last refresh
+            full_refreshed_at INTEGER NOT NULL,  -- epoch seconds of the last complete scrape
+            PRIMARY KEY (user_id, shelf)
+        )''',
+    ],
+    # 7: page to resume an interrupted full Goodreads scrape from (NULL when complete)
+    [
+        'ALTER TABLE goodreads_shelves ADD COLUMN resume_page INTEGER',
+    ],
+    # 8: per-day counts that the stats queries read instead of scanning actions.
+    # Kept current by triggers; hashtag is '' for actions without one.
+    [
+        '''CREATE TABLE IF NOT EXISTS daily_counts (
+            date TEXT NOT NULL,  -- UTC date, YYYY-MM-DD
+            hashtag TEXT NOT NULL,
+            action_type TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (date, hashtag, action_type)
+        ) WITHOUT ROWID''',
+        '''INSERT INTO daily_counts (date, hashtag, action_type, count)
+            SELECT substr(timestamp, 1, 10), COALESCE(hashtag, ''), action_type, COUNT(*)
+            FROM actions GROUP BY 1, 2, 3''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_actions_daily_insert AFTER INSERT ON actions BEGIN
+            INSERT INTO daily_counts (date, hashtag, action_type, count)
+            VALUES (substr(NEW.timestamp, 1, 10), COALESCE(NEW.hashtag, ''), NEW.action_type, 1)
+            ON CONFLICT (date, hashtag, action_type) DO UPDATE SET count = count + 1;
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_actions_daily_delete AFTER DELETE ON actions BEGIN
+            UPDATE daily_counts SET count = count - 1
+            WHERE date = substr(OLD.timestamp, 1, 10) AND hashtag = COALESCE(OLD.hashtag, '') AND action_type = OLD.action_type;
+        END''',
+    ],
+    # 9: integer epoch timestamps (ts). daily_counts is replaced by all-time totals per
+    # hashtag and action type, which get_stats and the hashtag chart read, and 15-minute
+    # epoch buckets of the last 90 days for the history chart. Buckets, unlike UTC dates,
+    # can be grouped into dates of any display timezone (every UTC offset in use is a
+    # multiple of 15 minutes).
+    [
+        'ALTER TABLE actions ADD COLUMN ts INTEGER',
+        "UPDATE actions SET ts = CAST(strftime('%s', timestamp) AS INTEGER) WHERE ts IS NULL",
+        'CREATE INDEX IF NOT EXISTS idx_actions_ts ON actions (ts)',
+        'CREATE INDEX IF NOT EXISTS idx_actions_type_ts ON actions (action_type, ts)',
+        'DROP INDEX IF EXISTS idx_actions_timestamp',
+        'DROP INDEX IF EXISTS idx_actions_type_timestamp',
+        'DROP TRIGGER IF EXISTS trg_actions_daily_insert',
+        'DROP TRIGGER IF EXISTS trg_actions_daily_delete',
+        'DROP TABLE IF EXISTS daily_counts',
+        '''CREATE TABLE IF NOT EXISTS action_totals (
+            hashtag TEXT NOT NULL,  -- '' for actions without one
+            action_type TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (hashtag, action_type)
+        ) WITHOUT ROWID''',
+        '''CREATE TABLE IF NOT EXISTS action_counts (
+            bucket INTEGER NOT NULL,  -- epoch seconds at the start of a 15-minute bucket
+            action_type TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (bucket, action_type)
+        ) WITHOUT ROWID''',
+        '''INSERT INTO action_totals (hashtag, action_type, count)
+            SELECT COALESCE(hashtag, ''), action_type, COUNT(*) FROM actions GROUP BY 1, 2''',
+        '''INSERT INTO action_counts (bucket, action_type, count)
+            SELECT ts - ts % 900, action_type, COUNT(*)
+            FROM actions WHERE ts >= CAST(strftime('%s', 'now') AS INTEGER) - 90 * 86400 GROUP BY 1, 2''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_actions_counts_insert AFTER INSERT ON actions BEGIN
+            INSERT INTO action_totals (hashtag, action_type, count)
+            VALUES (COALESCE(NEW.hashtag, ''), NEW.action_type, 1)
+            ON CONFLICT (hashtag, action_type) DO UPDATE SET count = count + 1;
+            INSERT INTO action_counts (bucket, action_type, count)
+            SELECT ts - ts % 900, NEW.action_type, 1
+            FROM (SELECT COALESCE(NEW.ts, CAST(strftime('%s', NEW.timestamp) AS INTEGER)) AS ts) WHERE ts IS NOT NULL
+            ON CONFLICT (bucket, action_type) DO UPDATE SET count = count + 1;
+            -- Keep 90 days of buckets; a range delete on the primary key, usually of nothing
+            DELETE FROM action_counts WHERE bucket < COALESCE(NEW.ts, CAST(strftime('%s', 'now') AS INTEGER)) - 90 * 86400;
+        END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_actions_counts_delete AFTER DELETE ON actions BEGIN
+            UPDATE action_totals SET count = count - 1
+            WHERE hashtag = COALESCE(OLD.hashtag, '') AND action_type = OLD.action_type;
+            UPDATE action_counts SET count = count - 1
+            WHERE bucket = OLD.ts - OLD.ts % 900 AND action_type = OLD.action_type;
+        END''',
+    ],
+    # 10: duration of each bot stage (see timing.py)
+    [
+        '''CREATE TABLE IF NOT EXISTS timings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts INTEGER NOT NULL,
+            stage TEXT NOT NULL,
+            duration_ms REAL NOT NULL,
+            ok INTEGER NOT NULL DEFAULT 1
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_timings_ts ON timings (ts)',
+        'CREATE INDEX IF NOT EXISTS idx_timings_stage_ts ON timings (stage, ts)',
+    ],
+    # 11: ledger of OpenAI requests (see usage.py) and its per-day rollup, kept by trigger.
+    # variant is '' in the rollup for requests without one.
+    [
+        '''CREATE TABLE IF NOT EXISTS openai_usage (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts INTEGER NOT NULL,
+            media_id TEXT,
+            call TEXT NOT NULL,
+            model TEXT NOT NULL,
+            variant TEXT,
+            prompt_tokens INTEGER,
+            completion_tokens INTEGER,
+            image_tokens INTEGER,
+            latency_ms REAL,
+            outcome TEXT NOT NULL
+        )''',
+        'CREATE INDEX IF NOT EXISTS idx_openai_usage_ts ON openai_usage (ts)',
+        'CREATE INDEX IF NOT EXISTS idx_openai_usage_media ON openai_usage (media_id)',
+        '''CREATE TABLE IF NOT EXISTS openai_usage_daily (
+            date TEXT NOT NULL,  -- UTC date, as OpenAI bills
+            model TEXT NOT NULL,
+            call TEXT NOT NULL,
+            variant TEXT NOT NULL,
+            outcome TEXT NOT NULL,
+            calls INTEGER NOT NULL,
+            prompt_tokens INTEGER NOT NULL,
+            completion_tokens INTEGER NOT NULL,
+            image_tokens INTEGER NOT NULL,
+            latency_ms REAL NOT NULL,
+            PRIMARY KEY (date, model, call, variant, outcome)
+        ) WITHOUT ROWID''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_openai_usage_daily AFTER INSERT ON openai_usage BEGIN
+            INSERT INTO openai_usage_daily (date, model, call, variant, outcome, calls,
+                prompt_tokens, completion_tokens, image_tokens, latency_ms)
+            VALUES (date(NEW.ts, 'unixepoch'), NEW.model, NEW.call, COALESCE(NEW.variant, ''), NEW.outcome, 1,
+                COALESCE(NEW.prompt_tokens, 0), COALESCE(NEW.completion_tokens, 0),
+                COALESCE(NEW.image_tokens, 0), COALESCE(NEW.latency_ms, 0))
+            ON CONFLICT (date, model, call, variant, outcome) DO UPDATE SET
+                calls = calls + 1,
+                prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+                completion_tokens = completion_tokens + excluded.completion_tokens,
+                image_tokens = image_tokens + excluded.image_tokens,
+                latency_ms = latency_ms + excluded.latency_ms;
+        END''',
+    ],
+    # 12: how many times each OpenAI request was retried (see openai_client.chat_completion)
+    [
+        'ALTER TABLE openai_usage ADD COLUMN retries INTEGER NOT NULL DEFAULT 0',
+    ],
+    # 13: error fingerprints on actions and per-kind counts in error_kinds (see fingerprint_error)
+    _add_error_fingerprints,
+    # 14: full-text search over comments and errors (see search_actions)
+    _add_actions_fts,
+]
+
+def migrate(conn):
+    """Bring the schema up to date, upgrading existing databases in place"""
+    conn.isolation_level = None  # Manage the transaction explicitly so DDL is included
     c = conn.cursor()
-    c.execute('''
-        INSERT INTO actions (timestamp, action_type, media_id, hashtag, comment, error, post_link)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', (datetime.utcnow().isoformat(), action_type, media_id, hashtag, comment, error, post_link))
-    conn.commit()
-    conn.close()
+    version = c.execute('PRAGMA user_version').fetchone()[0]
+    if version >= len(MIGRATIONS):
+        return version
+    # Take the write lock before re-reading the version so two processes can't both migrate
+    c.execute('BEGIN IMMEDIATE')
+    try:
+        version = c.execute('PRAGMA user_version').fetchone()[0]
+        for number, step in enumerate(MIGRATIONS[version:], start=version + 1):
+            if callable(step):
+                step(c)
+            else:
+                for statement in step:
+                    c.execute(statement)
+            c.execute(f'PRAGMA user_version = {number}')
+        c.execute('COMMIT')
+    except Exception:
+        c.execute('ROLLBACK')
+        raise
+    return len(MIGRATIONS)
+
+def init_db():
+    conn = connect()
+    try:
+        migrate(conn)
+    finally:
+        conn.close()
+
+# Action types that are checked for duplicates before acting on a post
+DEDUP_ACTION_TYPES = ('like', 'comment')
+# 64-bit hashes of (media_id, action_type) pairs already in the log; None until loaded
+_action_index = None
+
+def _action_key(media_id, action_type):
+    digest = hashlib.blake2b(f"{action_type}:{media_id}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+def load_action_index():
+    """Preload the duplicate-check index from the actions table. Call once per run;
+    log_action keeps it current afterwards. Returns the number of indexed actions."""
+    global _action_index
+    flush_actions()
+    conn = connect()
+    try:
+        rows = conn.execute(
+            'SELECT media_id, action_type FROM actions WHERE media_id IS NOT NULL AND action_type IN (?, ?)',
+            DEDUP_ACTION_TYPES
+        )
+        _action_index = {_action_key(media_id, action_type) for media_id, action_type in rows}
+    finally:
+        conn.close()
+    return len(_action_index)
+
+def _query_action(media_id, action_type):
+    if not flush_actions():  # Make sure our own queued actions are visible
+        return True  # One may still be queued; skip the post rather than risk a duplicate
+    conn = connect()
+    try:
+        c = conn.cursor()
+        c.execute('SELECT 1 FROM actions WHERE media_id=? AND action_type=? LIMIT 1', (str(media_id), action_type))
+        return c.fetchone() is not None
+    finally:
+        conn.close()
+
+def has_action(media_id, action_type):
+    """Return True if this action was already taken on the media"""
+    if _action_index is None or action_type not in DEDUP_ACTION_TYPES:
+        return _query_action(media_id, action_type)
+    if _action_key(str(media_id), action_type) not in _action_index:
+        return False
+    # A hit is rare (only real duplicates), so confirm it against the table to rule out hash collisions
+    return _query_action(media_id, action_type)
+
+def log_action(action_type, media_id=None, hashtag=None, comment=None, error=None, post_link=None):
+    if _action_index is not None and media_id is not None and action_type in DEDUP_ACTION_TYPES:
+        _action_index.add(_action_key(str(media_id), action_type))
+    now = time.time()
+    fingerprint = None
+    if error is not None:
+        error = str(error)
+        fingerprint, message = fingerprint_error(error)
+    _writer.submit('''
+        INSERT INTO actions (timestamp, ts, action_type, media_id, hashtag, comment, error, post_link, fingerprint)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (datetime.fromtimestamp(now, timezone.utc).isoformat(), int(now), action_type, media_id, hashtag, comment, error, post_link,
+          fingerprint))
+    if fingerprint is not None:
+        _writer.submit(ERROR_KIND_UPSERT, (fingerprint, message, error[:1000], int(now), int(now)))
 
 def get_stats():
-    conn = sqlite3.connect(DB_PATH)
+    flush_actions()
+    conn = connect()
     c = conn.cursor()
-    c.execute('SELECT action_type, COUNT(*) FROM actions GROUP BY action_type')
+    c.execute('SELECT action_type, SUM(count) FROM action_totals GROUP BY action_type')
     stats = dict(c.fetchall())
     conn.close()
     return stats
+
+def _fts_query(text):
+    # Quote each word so punctuation in the search box can't break FTS5 syntax; a
+    # trailing * still searches by prefix. Words must all match, in any order.
+    terms = []
+    for word in text.split():
+        prefix = word.endswith('*')
+        word = word.rstrip('*')
+        if word:
+            terms.append('"' + word.replace('"', '""') + '"' + ('*' if prefix else ''))
+    return ' '.join(terms)
+
+def search_actions(text, limit=50, action_type=None):
+    """Search logged comments and errors, best matches first. Returns dicts with id, ts,
+    action_type, media_id, hashtag, post_link, text (the matching comment, or the part of the
+    error around the match, with matches in [brackets]) and rank (lower is better)."""
+    flush_actions()
+    query = _fts_query(text)
+    if not query:
+        return []
+    conn = connect()
+    try:
+        params = [query]
+        type_clause = ''
+        if action_type:
+            type_clause = 'AND a.action_type = ?'
+            params.append(action_type)
+        try:
+            rows = conn.execute(f'''
+                SELECT a.id, a.ts, a.action_type, a.media_id, a.hashtag, a.post_link,
+                       snippet(actions_fts, -1, '[', ']', '…', 32),
+                       bm25(actions_fts) AS rank
+                FROM actions_fts JOIN actions a ON a.id = actions_fts.rowid
+                WHERE actions_fts MATCH ? {type_clause}
+                ORDER BY rank
+                LIMIT ?
+            ''', params + [limit]).fetchall()
+        except sqlite3.OperationalError:
+            # No FTS5 table (see migration 14): substring scan, newest first
+            like_params = ['%' + word.rstrip('*') + '%' for word in text.split() for _ in (0, 1)]
+            words = ' AND '.join('(a.comment LIKE ? OR a.error LIKE ?)' for _ in text.split())
+            rows = conn.execute(f'''
+                SELECT a.id, a.ts, a.action_type, a.media_id, a.hashtag, a.post_link,
+                       COALESCE(a.comment, a.error), NULL
+                FROM actions a
+                WHERE {words} {type_clause}
+                ORDER BY a.ts DESC
+                LIMIT ?
+            ''', like_params + params[1:] + [limit]).fetchall()
+    finally:
+        conn.close()
+    keys = ('id', 'ts', 'action_type', 'media_id', 'hashtag', 'post_link', 'text', 'rank')
+    return [dict(zip(keys, row)) for row in rows]
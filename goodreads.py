@@ -1,9 +1,92 @@
 import json
 import os
+import re
+import shutil
+import time
+import unicodedata
 import subprocess
+import threading
 import tempfile
 import requests
-from bs4 import BeautifulSoup
+import requests.adapters
+from concurrent.futures import ThreadPoolExecutor
+from bs4 import BeautifulSoup, SoupStrainer
+from db import connect
+
+# Shelf pages are mostly navigation and scripts; only the #books table is parsed
+_BOOKS_TABLE = SoupStrainer("table", id="books")
+_REVIEW_ROW_ID = re.compile(r"^review_")
+try:
+    import lxml.html  # Optional, much faster than html.parser
+    _SHELF_PARSER = "lxml"
+except ImportError:
+    _SHELF_PARSER = "html.parser"
+
+GOODREADS_URL = "https://www.goodreads.com"
+USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
+PER_PAGE = 100  # Books per shelf page (the most Goodreads serves)
+FETCH_CONCURRENCY = 3  # Shelf pages downloaded ahead of the one being parsed
+FETCH_RETRIES = 3  # Extra attempts per page on connection errors, timeouts, 429 and 5xx
+FETCH_BACKOFF = 1.0  # Seconds before the first retry, doubled after each attempt
+FULL_REFRESH_INTERVAL = 7 * 24 * 60 * 60  # Seconds between complete re-scrapes (picks up edits and removals)
+MIN_SINGLE_WORD_TITLE = 4  # One-word titles shorter than this ("It", "Us") match too many captions
+
+def normalize_title(text):
+    """Casefold, fold diacritics and turn punctuation into spaces, so titles and captions compare as word sequences"""
+    text = unicodedata.normalize('NFKD', (text or '').casefold())
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ' '.join(re.sub(r"[^\w\s]|_", ' ', text).split())
+
+def _title_variants(title):
+    # Goodreads titles carry series info ("Dune (Dune, #1)") and subtitles captions rarely repeat
+    variants = {title}
+    without_series = re.sub(r'\s*\([^()]*#[^()]*\)\s*$', '', title)
+    variants.add(without_series)
+    if ':' in without_series:
+        variants.add(without_series.split(':', 1)[0])
+    return variants
+
+class BookMatcher:
+    """Finds which shelved book a caption mentions, built once when the books are loaded.
+
+    Titles are normalized into word sequences and indexed by their first word, so a
+    caption is scanned once and only titles starting with one of its words are
+    compared. When several titles match, the longest wins.
+    """
+
+    def __init__(self, books):
+        self.books = list(books or [])
+        self._index = {}  # first word -> [(title words, book)], longest titles first
+        for book in self.books:
+            title = (book.get('title') or '').strip()
+            seen = set()
+            for variant in _title_variants(title):
+                words = tuple(normalize_title(variant).split())
+                if not words or words in seen:
+                    continue
+                if len(words) == 1 and len(words[0]) < MIN_SINGLE_WORD_TITLE:
+                    continue
+                seen.add(words)
+                self._index.setdefault(words[0], []).append((words, book))
+        for candidates in self._index.values():
+            candidates.sort(key=lambda c: (len(c[0]), sum(map(len, c[0]))), reverse=True)
+
+    def __len__(self):
+        return len(self.books)
+
+    def match(self, caption):
+        """Return the book whose title appears in the caption (longest title wins), or None"""
+        words = normalize_title(caption).split()
+        best, best_size = None, None
+        for i, word in enumerate(words):
+            for title_words, book in self._index.get(word, ()):
+                size = (len(title_words), sum(map(len, title_words)))
+                if best_size is not None and size <= best_size:
+                    break  # Candidates are sorted longest first, nothing better follows
+                if tuple(words[i:i + len(title_words)]) == title_words:
+                    best, best_size = book, size
+                    break
+        return best
 
 def get_goodreads_books(user_id):
     """Scrape Goodreads data for the given user_id and return books as a list of dicts. Returns an empty list if user_id is empty or scraping fails."""
@@ -26,88 +109,380 @@ def get_goodreads_books(user_id):
                 return json.load(f)
     except Exception as e:
         print(f"[WARNING] Error scraping Goodreads: {e}")
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
     # Always return an empty list on error, but do not raise
     return []
 
-def scrape_goodreads_books(user_id, shelf="read"):
-    """
-    Scrape all books from the user's Goodreads shelf (default: 'read') and return a list of books.
-    Each book is a dict with 'title', 'author', 'book_url', 'rating', and 'review'.
-    Handles pagination to fetch all books.
-    Compatible with Goodreads HTML as of 2025.
+def _book_key(book):
+    return book.get('book_url') or (book.get('title'), book.get('author'))
+
+def _read_shelf_cache(user_id, shelf):
+    conn = connect()
+    try:
+        return conn.execute(
+            'SELECT books, updated_at, full_refreshed_at, resume_page FROM goodreads_shelves WHERE user_id=? AND shelf=?',
+            (str(user_id), shelf)
+        ).fetchone()
+    finally:
+        conn.close()
+
+def load_cached_books(user_id, shelf="read"):
+    """Return the locally cached shelf for user_id (most recently added first), or [] if there is none"""
+    if not user_id:
+        return []
+    row = _read_shelf_cache(user_id, shelf)
+    return json.loads(row[0]) if row else []
+
+def save_cached_books(user_id, books, shelf="read", full=False, resume_page=None):
+    """Store the shelf for user_id; full=True records it as a complete scrape, and
+    resume_page marks a full scrape that stopped early"""
+    now = int(time.time())
+    conn = connect()
+    try:
+        with conn:
+            conn.execute('''
+                INSERT INTO goodreads_shelves (user_id, shelf, books, updated_at, full_refreshed_at, resume_page)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (user_id, shelf) DO UPDATE SET
+                    books = excluded.books,
+                    updated_at = excluded.updated_at,
+                    full_refreshed_at = CASE WHEN ? THEN excluded.full_refreshed_at ELSE full_refreshed_at END,
+                    resume_page = excluded.resume_page
+            ''', (str(user_id), shelf, json.dumps(books), now, now if full else 0, resume_page, int(full)))
+    finally:
+        conn.close()
+
+def refresh_goodreads_books(user_id, shelf="read", **scrape_options):
+    """Bring the cached shelf up to date and return it.
+
+    Normally only the newest pages are scraped (sorted by date added), stopping at
+    the first book already in the cache. Without a cache, or every
+    FULL_REFRESH_INTERVAL, the whole shelf is scraped again. A full scrape that
+    fails part way is saved with the page to resume from, and the next refresh
+    continues there.
     """
-    books = []
-    page = 1
-    per_page = 100
-    headers = {
-        "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
+    if not user_id:
+        return []
+    row = _read_shelf_cache(user_id, shelf)
+    cached = json.loads(row[0]) if row else []
+    resume_page = row[3] if row else None
+    if resume_page:
+        # Finish an interrupted full scrape; pages may have shifted, so drop repeats
+        known = {_book_key(book) for book in cached}
+        older, resume_page = scrape_shelf_pages(user_id, shelf=shelf, start_page=resume_page, **scrape_options)
+        books = cached + [book for book in older if _book_key(book) not in known]
+        save_cached_books(user_id, books, shelf=shelf, full=resume_page is None, resume_page=resume_page)
+        return books
+    if not row or time.time() - row[2] >= FULL_REFRESH_INTERVAL:
+        books, resume_page = scrape_shelf_pages(user_id, shelf=shelf, **scrape_options)
+        if not books:
+            return cached  # Scrape failed; keep what we have
+        if resume_page and cached:
+            # Partial re-scrape of an existing shelf: keep the cached copy and try again next time
+            return cached
+        save_cached_books(user_id, books, shelf=shelf, full=resume_page is None, resume_page=resume_page)
+        return books
+    known = {_book_key(book) for book in cached}
+    options = dict(scrape_options, concurrency=1)  # Usually a single page; don't fetch far ahead
+    new_books, _ = scrape_shelf_pages(user_id, shelf=shelf, known_keys=known, **options)
+    books = new_books + cached
+    save_cached_books(user_id, books, shelf=shelf)
+    return books
+
+def _parse_row(row):
+    # Title
+    title = None
+    book_url = None
+    title_cell = row.find("td", {"class": "field title"})
+    if title_cell:
+        value_div = title_cell.find("div", {"class": "value"})
+        if value_div:
+            link = value_div.find("a")
+            if link:
+                title = link.get_text(strip=True)
+                if link.has_attr("href"):
+                    book_url = "https://www.goodreads.com" + link["href"]
+    # Author
+    author = None
+    author_cell = row.find("td", {"class": "field author"})
+    if author_cell:
+        value_div = author_cell.find("div", {"class": "value"})
+        if value_div:
+            author_link = value_div.find("a")
+            if author_link:
+                author = author_link.get_text(strip=True)
+    # Rating
+    rating = None
+    stars_div = row.find("div", {"class": "stars"})
+    if stars_div and stars_div.has_attr("data-rating"):
+        try:
+            rating = int(stars_div["data-rating"])
+        except Exception:
+            rating = None
+    # Review
+    review = None
+    review_cell = row.find("td", {"class": "field review"})
+    if review_cell:
+        value_div = review_cell.find("div", {"class": "value"})
+        if value_div:
+            review_text = value_div.get_text(strip=True)
+            if review_text:
+                review = review_text
+    if not (title and author):
+        return None
+    return {
+        "title": title,
+        "author": author,
+        "book_url": book_url,
+        "rating": rating,
+        "review": review
     }
-    while True:
-        base_url = f"https://www.goodreads.com/review/list/{user_id}?shelf={shelf}&per_page={per_page}&page={page}"
+
+def _parse_books_table(table):
+    rows = table.find_all("tr", id=_REVIEW_ROW_ID)
+    books = [book for book in map(_parse_row, rows) if book]
+    return books, len(rows)
+
+def _class_is(name):
+    # Same rule as BeautifulSoup's class matching: the whole class string, or any one class, equals name
+    if " " in name:
+        return f'normalize-space(@class)="{name}"'
+    return f'contains(concat(" ", normalize-space(@class), " "), " {name} ")'
+
+def _first(element, xpath):
+    found = element.xpath(xpath)
+    return found[0] if found else None
+
+def _text(element):
+    # Equivalent of BeautifulSoup's get_text(strip=True), which also skips script/style contents
+    parts = element.xpath(".//text()[not(ancestor::script) and not(ancestor::style) and not(ancestor::template)]")
+    return "".join(part.strip() for part in parts)
+
+def _value_div(row, cell_class):
+    # First <div class="value"> inside the first matching cell, like row.find(td).find(div)
+    cell = _first(row, f'.//td[{_class_is(cell_class)}]')
+    if cell is None:
+        return None
+    return _first(cell, f'.//div[{_class_is("value")}]')
+
+def _parse_row_lxml(row):
+    title = None
+    book_url = None
+    value_div = _value_div(row, "field title")
+    if value_div is not None:
+        link = _first(value_div, './/a')
+        if link is not None:
+            title = _text(link)
+            if link.get("href") is not None:
+                book_url = "https://www.goodreads.com" + link.get("href")
+    author = None
+    value_div = _value_div(row, "field author")
+    if value_div is not None:
+        author_link = _first(value_div, './/a')
+        if author_link is not None:
+            author = _text(author_link)
+    rating = None
+    stars_div = _first(row, f'.//div[{_class_is("stars")}]')
+    if stars_div is not None and stars_div.get("data-rating") is not None:
+        try:
+            rating = int(stars_div.get("data-rating"))
+        except Exception:
+            rating = None
+    review = None
+    value_div = _value_div(row, "field review")
+    if value_div is not None:
+        review = _text(value_div) or None
+    if not (title and author):
+        return None
+    return {
+        "title": title,
+        "author": author,
+        "book_url": book_url,
+        "rating": rating,
+        "review": review
+    }
+
+def _parse_shelf_page_lxml(html):
+    if not html or not html.strip():
+        return None  # lxml refuses empty documents
+    doc = lxml.html.fromstring(html)
+    table = _first(doc, '//table[@id="books"]')
+    if table is None:
+        return None
+    rows = table.xpath('.//tr[starts-with(@id, "review_")]')
+    books = [book for book in map(_parse_row_lxml, rows) if book]
+    return books, len(rows)
+
+def parse_shelf_page(html):
+    """Parse one shelf page into (books, row_count), or None if it has no books table.
+    Uses lxml and XPath when lxml is installed; otherwise only the #books table is
+    built into a BeautifulSoup tree. Produces the same books as parse_shelf_page_full."""
+    if _SHELF_PARSER == "lxml":
+        return _parse_shelf_page_lxml(html)
+    soup = BeautifulSoup(html, _SHELF_PARSER, parse_only=_BOOKS_TABLE)
+    table = soup.find("table", {"id": "books"})
+    if not table:
+        return None
+    return _parse_books_table(table)
+
+def parse_shelf_page_full(html):
+    """Reference parser: builds the whole document with html.parser. Kept to check and
+    benchmark parse_shelf_page against."""
+    soup = BeautifulSoup(html, "html.parser")
+    table = soup.find("table", {"id": "books"})
+    if not table:
+        return None
+    return _parse_books_table(table)
+
+def benchmark_shelf_parsers(pages, repeat=3):
+    """Time parse_shelf_page against parse_shelf_page_full over saved shelf pages (HTML strings).
+    Raises AssertionError if they disagree on any page; returns mean milliseconds per page."""
+    for i, html in enumerate(pages):
+        assert parse_shelf_page(html) == parse_shelf_page_full(html), f"Parsers disagree on page {i + 1}"
+    results = {}
+    for name, parser in (("full_html_parser", parse_shelf_page_full), (_SHELF_PARSER, parse_shelf_page)):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for html in pages:
+                parser(html)
+        results[name] = (time.perf_counter() - start) * 1000 / (repeat * max(len(pages), 1))
+    return results
+
+def _make_session(pool_size):
+    # One pooled keep-alive session for all pages of a scrape
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["User-Agent"] = USER_AGENT
+    return session
+
+class _RetryableError(Exception):
+    def __init__(self, message, retry_after=0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+def _fetch_page(session, url, retries=FETCH_RETRIES, backoff=FETCH_BACKOFF, stop=None):
+    """GET one shelf page, retrying connection errors, timeouts, 429 and 5xx with exponential backoff.
+    Setting the stop event abandons the retries."""
+    for attempt in range(retries + 1):
         try:
-            resp = requests.get(base_url, headers=headers, timeout=30)
+            resp = session.get(url, timeout=30)
+            if resp.status_code == 429 or resp.status_code >= 500:
+                retry_after = resp.headers.get("Retry-After", "")
+                raise _RetryableError(f"HTTP {resp.status_code}", float(retry_after) if retry_after.isdigit() else 0)
             resp.raise_for_status()
-            soup = BeautifulSoup(resp.text, "html.parser")
-            table = soup.find("table", {"id": "books"})
-            if not table:
-                print(f"[WARNING] Could not find books table on Goodreads shelf page (page {page}). Printing HTML snippet for debugging:")
-                print(resp.text[:1000])
+            return resp.text
+        except (requests.ConnectionError, requests.Timeout, _RetryableError) as e:
+            if attempt == retries or (stop is not None and stop.is_set()):
+                raise
+            delay = max(backoff * 2 ** attempt, getattr(e, "retry_after", 0))
+            print(f"[WARNING] Goodreads request failed ({e}), retrying in {delay:.0f}s: {url}")
+            if stop is not None and stop.wait(delay):
+                raise
+
+def _fetch_and_parse(session, url, stop):
+    # Runs on a worker so the scrape loop can see a short (last) page before fetching past it
+    html = _fetch_page(session, url, stop=stop)
+    return html, parse_shelf_page(html)
+
+def _is_last_page(parsed, per_page):
+    return parsed is None or parsed[1] < per_page
+
+def scrape_shelf_pages(user_id, shelf="read", known_keys=None, start_page=1, base_url=GOODREADS_URL,
+                       concurrency=FETCH_CONCURRENCY, progress=None):
+    """
+    Scrape the shelf from start_page onwards and return (books, resume_page).
+
+    Pages are fetched through a pooled session by up to `concurrency` background
+    workers, so the next pages download while the current one is parsed. Each
+    page is retried on its own; if one still fails, scraping stops and
+    resume_page is the page to start from next time (None once the shelf is
+    complete). progress(page, books), if given, is called after each parsed page.
+    base_url can point at a local stand-in server for testing.
+    """
+    books = []
+    per_page = PER_PAGE
+    session = _make_session(concurrency)
+
+    def page_url(number):
+        return (f"{base_url}/review/list/{user_id}?shelf={shelf}&per_page={per_page}&page={number}"
+                "&sort=date_added&order=d")
+
+    pool = ThreadPoolExecutor(max_workers=concurrency)
+    stop = threading.Event()
+    pending = {}  # page number -> future of its (html, parsed page)
+    next_to_fetch = start_page
+    last_page = None  # Set once a downloaded page is known to be the last (short, empty or failed)
+    page = start_page
+    resume_page = None
+    try:
+        while True:
+            for number, future in pending.items():
+                if future.done() and (future.exception() is not None or _is_last_page(future.result()[1], per_page)):
+                    last_page = number if last_page is None else min(last_page, number)
+            # Keep up to `concurrency` pages in flight, but none past a page known to be the last.
+            # The window grows by one page per full page parsed: most refreshes stop on the
+            # first page at a known book, and short shelves end before it is fully open.
+            window = min(concurrency, page - start_page + 1)
+            while len(pending) < window and (last_page is None or next_to_fetch <= last_page):
+                pending[next_to_fetch] = pool.submit(_fetch_and_parse, session, page_url(next_to_fetch), stop)
+                next_to_fetch += 1
+            try:
+                html, parsed = pending.pop(page).result()
+            except Exception as e:
+                print(f"[WARNING] Error scraping Goodreads shelf page {page}: {e}")
+                resume_page = page
                 break
-            rows = table.find_all("tr", {"id": lambda x: x and x.startswith("review_")})
-            if not rows:
+            if parsed is None:
+                print(f"[WARNING] Could not find books table on Goodreads shelf page (page {page}). Printing HTML snippet for debugging:")
+                print(html[:1000])
+                resume_page = page
                 break
-            for row in rows:
-                # Title
-                title = None
-                book_url = None
-                title_cell = row.find("td", {"class": "field title"})
-                if title_cell:
-                    value_div = title_cell.find("div", {"class": "value"})
-                    if value_div:
-                        link = value_div.find("a")
-                        if link:
-                            title = link.get_text(strip=True)
-                            if link.has_attr("href"):
-                                book_url = "https://www.goodreads.com" + link["href"]
-                # Author
-                author = None
-                author_cell = row.find("td", {"class": "field author"})
-                if author_cell:
-                    value_div = author_cell.find("div", {"class": "value"})
-                    if value_div:
-                        author_link = value_div.find("a")
-                        if author_link:
-                            author = author_link.get_text(strip=True)
-                # Rating
-                rating = None
-                stars_div = row.find("div", {"class": "stars"})
-                if stars_div and stars_div.has_attr("data-rating"):
-                    try:
-                        rating = int(stars_div["data-rating"])
-                    except Exception:
-                        rating = None
-                # Review
-                review = None
-                review_cell = row.find("td", {"class": "field review"})
-                if review_cell:
-                    value_div = review_cell.find("div", {"class": "value"})
-                    if value_div:
-                        review_text = value_div.get_text(strip=True)
-                        if review_text:
-                            review = review_text
-                if title and author:
-                    books.append({
-                        "title": title,
-                        "author": author,
-                        "book_url": book_url,
-                        "rating": rating,
-                        "review": review
-                    })
-            # If less than per_page books found, this is the last page
-            if len(rows) < per_page:
+            page_books, row_count = parsed
+            reached_known = False
+            for book in page_books:
+                if known_keys is not None and _book_key(book) in known_keys:
+                    reached_known = True
+                    break
+                books.append(book)
+            if progress:
+                progress(page, books)
+            # Stop after a known book (the rest is cached) or a short page (the last one)
+            if reached_known or row_count < per_page:
                 break
             page += 1
-        except Exception as e:
-            print(f"[WARNING] Error scraping Goodreads shelf page {page}: {e}")
-            break
+    finally:
+        # Don't wait on pages we no longer need (or their retries)
+        stop.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+        session.close()
+    return books, resume_page
+
+def scrape_goodreads_books(user_id, shelf="read", known_keys=None, **kwargs):
+    """
+    Scrape all books from the user's Goodreads shelf (default: 'read') and return a list of books.
+    Each book is a dict with 'title', 'author', 'book_url', 'rating', and 'review'.
+    Handles pagination to fetch all books. Books come most recently added first; if
+    known_keys is given, scraping stops at the first book already known (see _book_key).
+    Extra keyword arguments are passed to scrape_shelf_pages.
+    Compatible with Goodreads HTML as of 2025.
+    """
+    books, _ = scrape_shelf_pages(user_id, shelf=shelf, known_keys=known_keys, **kwargs)
     return books
+
+if __name__ == "__main__":
+    # Usage: python goodreads.py [page1.html ...]  (shelf pages saved from a browser; without
+    # any, the synthetic pages from goodreads_fixtures.py)
+    import sys
+    saved_pages = []
+    for path in sys.argv[1:]:
+        with open(path, encoding="utf-8") as f:
+            saved_pages.append(f.read())
+    if not saved_pages:
+        from goodreads_fixtures import shelf_pages
+        saved_pages = shelf_pages(500)
+        print(f"Benchmarking on {len(saved_pages)} fixture pages.")
+    for name, ms in benchmark_shelf_parsers(saved_pages).items():
+        print(f"{name}: {ms:.1f} ms/page")
@@ -0,0 +1,210 @@
+"""
+Synthetic Goodreads shelf pages and a local stand-in server for them, for checking
+and benchmarking the shelf parsers and scrape_shelf_pages without goodreads.com.
+
+    python goodreads_fixtures.py   # checks the parsers and the scraper against the fixtures
+    python goodreads.py            # benchmarks the parsers on them
+
+Pages follow the markup of a real shelf page as of 2025: navigation and scripts
+around a #books table of review_ rows. Some rows cover the cases where the lxml
+parser could diverge from BeautifulSoup: multi-class cells, a <script> and a
+<style> inside a review, a row without an author and non-ASCII titles.
+"""
+import html
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from goodreads import (FETCH_CONCURRENCY, _SHELF_PARSER, _book_key, parse_shelf_page, parse_shelf_page_full,
+                       scrape_shelf_pages)
+
+PAGE_ROWS = 100  # Rows on a full shelf page (Goodreads serves at most 100 per page)
+
+_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<title>Reader&#39;s bookshelf: read (showing {first}-{last} of {total})</title>
+<script>window.ReactRailsUJS = {{ mountComponents: function () {{}} }};</script>
+<style>.stars {{ color: #e87400; }}</style>
+</head>
+<body>
+<div class="siteHeader"><nav><a href="/">Home</a> <a href="/review/list/1">My Books</a> <a href="/recommendations">Browse</a></nav></div>
+<div id="leftCol"><div id="shelvesSection"><a class="selectedShelf" href="/review/list/1?shelf=read">Read ({total})</a></div></div>
+<div id="rightCol">
+<table id="books" class="table stacked">
+<thead><tr><th class="header field title">title</th><th class="header field author">author</th><th class="header field rating">rating</th><th class="header field review">review</th></tr></thead>
+<tbody id="booksBody">
+{rows}
+</tbody>
+</table>
+<div id="reviewPagination">{pagination}</div>
+</div>
+<script>var tracking = {{ page: {page}, books: "{first}-{last}" }};</script>
+</body>
+</html>
+"""
+
+_ROW = """<tr id="review_{id}" class="bookalike review">
+<td class="field checkbox"><label><input type="checkbox" name="reviews[{id}]"></label></td>
+<td class="{title_class}"><label>title</label><div class="value"><a title="{title}" href="/book/show/{id}-book">{title}
+<span class="darkGreyText">({series})</span></a></div></td>
+<td class="{author_class}"><label>author</label><div class="value">{author}</div></td>
+<td class="field rating"><label>my rating</label><div class="value"><div class="{stars_class}" data-rating="{rating}" data-resource-id="{id}"><a class="star on" title="it was ok">&#9733;</a></div></div></td>
+<td class="field review"><label>review</label><div class="value">{review}</div></td>
+<td class="field date_added"><label>date added</label><div class="value"><span title="March 3, 2025">Mar 03, 2025</span></div></td>
+</tr>"""
+
+_TITLES = ["The Name of the Wind", "Cien años de soledad", "Dune", "Ficciones", "Les Misérables", "It",
+           "The Left Hand of Darkness", "Piranesi", "Never Let Me Go", "A Wizard of Earthsea"]
+_AUTHORS = ["Patrick Rothfuss", "Gabriel García Márquez", "Frank Herbert", "Jorge Luis Borges", "Victor Hugo",
+            "Stephen King", "Ursula K. Le Guin", "Susanna Clarke", "Kazuo Ishiguro", "Ursula K. Le Guin"]
+
+def _row(n):
+    title = html.escape(f"{_TITLES[n % len(_TITLES)]} {n}")
+    author = f'<a href="/author/show/{n}">{html.escape(_AUTHORS[n % len(_AUTHORS)])}</a>'
+    review = "" if n % 3 else f"Loved it &amp; would reread. <b>Book {n}</b> of the year."
+    title_class, author_class, stars_class = "field title", "field author", "stars"
+    if n % 10 == 1:
+        # Multi-class cells: only an exact class string (or a single class) matches "field title"
+        author_class, stars_class = "field  author", "stars small"
+        title_class = "field title sortable" if n % 20 == 1 else "field title"
+    if n % 10 == 2:
+        # Script and style inside a review are not part of its text
+        review = ("Spoilers below<script>document.write('hidden')</script>"
+                  "<style>.spoiler { display: none; }</style> read to the end.")
+    if n % 25 == 7:
+        author = "<span>unknown</span>"  # No author link: the row is skipped
+    return _ROW.format(id=1000 + n, title=title, series=f"Series, #{n % 4 + 1}", title_class=title_class,
+                       author=author, author_class=author_class, stars_class=stars_class, rating=n % 6,
+                       review=review)
+
+def shelf_page(page, total_books, per_page=PAGE_ROWS):
+    """HTML of one shelf page of a shelf holding total_books; pages past the end have an empty table"""
+    first = (page - 1) * per_page
+    last = min(first + per_page, total_books)
+    rows = "\n".join(_row(n) for n in range(first, last))
+    pagination = " ".join(f'<a href="?page={p}">{p}</a>' for p in range(1, (total_books - 1) // per_page + 2))
+    return _PAGE.format(rows=rows, page=page, first=first + 1, last=last, total=total_books,
+                        pagination=pagination)
+
+def shelf_pages(total_books, per_page=PAGE_ROWS):
+    """Every page of a shelf holding total_books"""
+    return [shelf_page(page, total_books, per_page) for page in range(1, (total_books - 1) // per_page + 2)]
+
+def check_parsers(pages=None):
+    """Assert both parsers agree on the fixture pages and handle the edge-case rows"""
+    pages = pages or shelf_pages(250)
+    for i, page in enumerate(pages):
+        assert parse_shelf_page(page) == parse_shelf_page_full(page), f"Parsers disagree on page {i + 1}"
+    books, row_count = parse_shelf_page(pages[0])
+    by_id = {int(book["book_url"].rsplit("/", 1)[1].split("-")[0]): book for book in books}
+    assert row_count == PAGE_ROWS
+    assert 1001 not in by_id  # "field title sortable" is not the title cell
+    assert by_id[1011]["author"] == "Gabriel García Márquez" and by_id[1011]["rating"] == 5  # "field  author", "stars small"
+    assert by_id[1002]["review"] == "Spoilers belowread to the end."  # No script or style text
+    assert 1007 not in by_id  # No author link
+    assert by_id[1003]["title"] == "Ficciones 3(Series, #4)"
+    print(f"Both parsers agree on {len(pages)} fixture pages (fast parser: {_SHELF_PARSER}).")
+
+class StandInServer:
+    """Local HTTP stand-in for goodreads.com serving the fixture pages of a shelf of total_books.
+
+    unavailable maps a page number to how many requests for it get a 503 before it is
+    served; requests for fail_page always get a 404. requested lists the page numbers
+    asked for, in order. Use as a context manager; pass base_url to scrape_shelf_pages.
+    """
+
+    def __init__(self, total_books, unavailable=None, fail_page=None, delay=0.01):
+        self.total_books = total_books
+        self.unavailable = dict(unavailable or {})
+        self.fail_page = fail_page
+        self.delay = delay  # Seconds per response, so pages overlap as they would over a network
+        self.requested = []
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self._server.server_port}"
+
+    def __enter__(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)
+                page = int(query.get("page", ["1"])[0])
+                per_page = int(query.get("per_page", [str(PAGE_ROWS)])[0])
+                status, body = stand_in._respond(page, per_page)
+                time.sleep(stand_in.delay)
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                if status == 503:
+                    self.send_header("Retry-After", "0")
+                self.end_headers()
+                self.wfile.write(body.encode("utf-8"))
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _respond(self, page, per_page):
+        with self._lock:
+            self.requested.append(page)
+            if page == self.fail_page:
+                return 404, "Not found"
+            if self.unavailable.get(page, 0) > 0:
+                self.unavailable[page] -= 1
+                return 503, "Service unavailable"
+        return 200, shelf_page(page, self.total_books, per_page)
+
+def _shelf_books(total_books, pages=None):
+    books = []
+    for page in shelf_pages(total_books)[:pages]:
+        books += parse_shelf_page(page)[0]
+    return books
+
+def check_scrape():
+    """Assert scrape_shelf_pages reads whole shelves, retries 503s, stops at a failed page or a
+    known book without waiting on pages still in flight, and requests few pages past the end"""
+    # Past the last page, at most the pages already in flight (FETCH_CONCURRENCY - 1) are requested
+    for total in (40, 100, 250, 300, 1000):
+        last_page = total // PAGE_ROWS + 1  # The first page with fewer than PAGE_ROWS rows
+        with StandInServer(total) as server:
+            books, resume_page = scrape_shelf_pages("1", base_url=server.base_url)
+        assert resume_page is None and books == _shelf_books(total), f"{total} books"
+        assert sorted(server.requested) == list(range(1, max(server.requested) + 1)), server.requested
+        extra = max(server.requested) - last_page
+        assert extra <= FETCH_CONCURRENCY - 1, f"{total} books: requested pages {server.requested}"
+        print(f"{total} books: {last_page} pages read, {extra} requested past the last")
+    # A 503 is retried; the scrape still completes
+    with StandInServer(250, unavailable={2: 1}) as server:
+        books, resume_page = scrape_shelf_pages("1", base_url=server.base_url)
+    assert resume_page is None and books == _shelf_books(250)
+    assert server.requested.count(2) == 2
+    # A hard failure stops at that page, without waiting on later pages stuck in retries
+    with StandInServer(1000, unavailable={4: 99, 5: 99}, fail_page=3) as server:
+        start = time.monotonic()
+        books, resume_page = scrape_shelf_pages("1", base_url=server.base_url)
+        elapsed = time.monotonic() - start
+    assert resume_page == 3 and books == _shelf_books(1000, pages=2)
+    assert elapsed < 1, f"waited {elapsed:.1f}s on pages past the failure"
+    # A known book on the first page ends the scrape there
+    known = {_book_key(book) for book in _shelf_books(1000)[10:]}
+    with StandInServer(1000) as server:
+        books, resume_page = scrape_shelf_pages("1", base_url=server.base_url, known_keys=known)
+    assert resume_page is None and books == _shelf_books(1000)[:10] and server.requested == [1]
+    print("Scraper checks passed.")
+
+if __name__ == "__main__":
+    check_parsers()
+    check_scrape()
@@ -4,14 +4,22 @@ import time
 import random
 import requests
 import os
-from db import log_action, init_db
+import io
+from PIL import Image
+from db import log_action, init_db, load_action_index, has_action
+from cache import following_cache, profile_cache, vision_cache
+from timing import timed, purge_timings
 import pytz
 from datetime import datetime, timedelta
+from collections import Counter
 import string
 
 logging.basicConfig(filename='instabot.log', level=logging.INFO, format='%(asctime)s %(levelname)s:%(message)s')
 
 SESSION_FILE = "session.json"
+IMAGE_MAX_DIMENSION = 512  # Longest side, in pixels, of images sent to the vision model
+IMAGE_QUALITY = 80  # JPEG quality used when re-encoding downscaled images
+MAX_IMAGE_BYTES = 10 * 1024 * 1024  # Downloads larger than this are abandoned
 
 def random_device_settings():
     # Generate random device settings for instagrapi Client
@@ -80,33 +88,23 @@ def login_instagram(username, password):
             else:
                 raise e
 
-def has_action(media_id, action_type):
-    import sqlite3
-    conn = sqlite3.connect('instabot.db')
-    c = conn.cursor()
-    c.execute('SELECT 1 FROM actions WHERE media_id=? AND action_type=? LIMIT 1', (str(media_id), action_type))
-    result = c.fetchone()
-    conn.close()
-    return result is not None
-
 def get_media_details(cl, media):
-    # Fetch extra details for personalization
-    user = cl.user_info(media.user.pk)
+    # Fetch extra details for personalization (authors repeat a lot, so this is cached)
+    user = profile_cache.get(cl, media.user.pk)
     # Determine if this is the user's own post
     is_own_post = False
     is_following = False
     try:
         # cl.user_id is the logged-in user's id
         is_own_post = (media.user.pk == cl.user_id)
-        # Check if the logged-in user is following the post's author
-        # cl.user_following returns a dict of user_id: UserShort
-        following_dict = cl.user_following(cl.user_id)
-        is_following = str(media.user.pk) in [str(uid) for uid in following_dict.keys()]
+        # Check if the logged-in user is following the post's author (cached per session)
+        is_following = following_cache.is_following(cl, media.user.pk)
     except Exception:
         pass
     details = {
-        'username': user.username,
-        'full_name': user.full_name,
+        'media_id': str(media.id),
+        'username': user['username'],
+        'full_name': user['full_name'],
         'caption': media.caption_text or "",
         'like_count': getattr(media, 'like_count', None),
         'comment_count': getattr(media, 'comment_count', None),
@@ -116,23 +114,43 @@ def get_media_details(cl, media):
     }
     return details
 
-def download_image(url, media_id):
+def downscale_image(fp, max_dimension=IMAGE_MAX_DIMENSION, quality=IMAGE_QUALITY):
+    """Shrink an image so its longest side is at most max_dimension and re-encode it as JPEG bytes"""
+    with Image.open(fp) as img:
+        img = img.convert('RGB')
+        img.thumbnail((max_dimension, max_dimension))
+        out = io.BytesIO()
+        img.save(out, format='JPEG', quality=quality, optimize=True)
+    return out.getvalue()
+
+def download_image(url, media_id, max_dimension=IMAGE_MAX_DIMENSION, quality=IMAGE_QUALITY):
+    """Stream a post image into memory and return it downscaled, as JPEG bytes ready for the vision call"""
     if not url:
         return None
-    img_dir = 'media_images'
-    os.makedirs(img_dir, exist_ok=True)
-    img_path = os.path.join(img_dir, f'{media_id}.jpg')
     try:
-        response = requests.get(url, timeout=10)
-        if response.status_code == 200:
-            with open(img_path, 'wb') as f:
-                f.write(response.content)
-            return img_path
+        with requests.get(url, timeout=10, stream=True) as response:
+            if response.status_code != 200:
+                return None
+            if int(response.headers.get('Content-Length') or 0) > MAX_IMAGE_BYTES:
+                logging.warning(f"Image for {media_id} is larger than {MAX_IMAGE_BYTES} bytes, skipping it.")
+                return None
+            buffer = io.BytesIO()
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                buffer.write(chunk)
+                if buffer.tell() > MAX_IMAGE_BYTES:
+                    logging.warning(f"Image for {media_id} is larger than {MAX_IMAGE_BYTES} bytes, skipping it.")
+                    return None
+        buffer.seek(0)
+        return downscale_image(buffer, max_dimension, quality)
     except Exception as e:
         logging.error(f"Failed to download image for {media_id}: {e}")
     return None
 
-def like_and_comment(cl, hashtags, like_limit, comment_limit, openai_comment_fn, allow_sensitive=True, avoid_hashtags=None):
+def like_and_comment(cl, hashtags, like_limit, comment_limit, openai_comment_fn, allow_sensitive=True, avoid_hashtags=None,
+                     image_max_dimension=IMAGE_MAX_DIMENSION, image_quality=IMAGE_QUALITY, progress=None):
+    """Like and comment on recent posts of the hashtags. progress, if given, is called as
+    progress(kind, **data) from this thread with events: 'status' (message), 'like' and
+    'comment' (media_id, hashtag, post_link), 'error' (stage, message) and 'timing' (stage, seconds)."""
     import math
     import datetime
     import time
@@ -168,120 +186,128 @@ def like_and_comment(cl, hashtags, like_limit, comment_limit, openai_comment_fn,
         # Cluster actions between 8am and 11pm local time
         now = datetime.datetime.now()
         return 8 <= now.hour <= 23
+    def report(kind, **data):
+        if progress is None:
+            return
+        try:
+            progress(kind, **data)
+        except Exception as e:
+            logging.warning(f"Progress callback failed for {kind} event: {e}")
+    def run_stage(stage, fn, *args, **kwargs):
+        # Run one stage of a post's pipeline, timed like any other stage, and report it to the UI
+        with timed(stage, on_done=lambda seconds, ok: report('timing', stage=stage, seconds=seconds)):
+            return fn(*args, **kwargs)
+    # Load the duplicate-check index once so has_action is an in-memory lookup
+    indexed = load_action_index()
+    logging.info(f"Loaded {indexed} past likes/comments into the duplicate-check index.")
+    purged = vision_cache.purge()
+    if purged:
+        logging.info(f"Purged {purged} expired vision analyses from the cache.")
+    purge_timings()
     last_action_time = time.time()
+    def pause_after_action():
+        nonlocal last_action_time
+        last_action_time += next_delay()
+        time_to_wait = max(0, last_action_time - time.time())
+        if time_to_wait > 0:
+            time.sleep(time_to_wait)
+        random_long_break()
+    def like_post(media, hashtag, post_link):
+        nonlocal liked
+        try:
+            run_stage('like', cl.media_like, media.id)
+            logging.info(f"Liked post {media.id} (hashtag: {hashtag}) | Link: {post_link}")
+            log_action('like', media_id=media.id, hashtag=hashtag, post_link=post_link)
+            liked += 1
+            report('like', media_id=str(media.id), hashtag=hashtag, post_link=post_link)
+        except Exception as e:
+            logging.error(f"Failed to like post {media.id}: {e}")
+            log_action('error', media_id=media.id, hashtag=hashtag, error=str(e), post_link=post_link)
+            report('error', stage='like', message=str(e))
+    # Posts dropped at each stage, cheapest stages first
+    drops = Counter()
     for hashtag in hashtags:
-        medias = cl.hashtag_medias_recent(hashtag.strip(), amount=10)
+        if liked >= like_limit and commented >= comment_limit:
+            break
+        report('status', message=f"Browsing #{hashtag.strip()} ({liked}/{like_limit} likes, {commented}/{comment_limit} comments)")
+        medias = run_stage('hashtag_feed', cl.hashtag_medias_recent, hashtag.strip(), amount=10)
         medias = list(medias)
         random.shuffle(medias)
         for media in medias:
             # Sometimes just "view" the post and do nothing
             if random.random() < 0.08:
                 logging.info(f"Simulated viewing post {media.id} (no action taken)")
+                drops['viewed_only'] += 1
                 time.sleep(random.uniform(3, 10))
                 continue
-            # Only act during waking hours (else, wait until morning)
-            while not is_waking_hours():
-                logging.info("Sleeping until morning to avoid night-time bot activity.")
-                time.sleep(60 * 15)  # Sleep 15 minutes
-            details = get_media_details(cl, media)
-            img_path = download_image(details.get('media_url'), media.id)
-            details['image_path'] = img_path
             post_link = f"https://www.instagram.com/p/{media.code}/"
-            details['post_link'] = post_link
-            caption = (details.get('caption') or '').lower()
+            # --- Stage 1: filters that only need the feed item (no API calls) ---
+            caption = (media.caption_text or '').lower()
             media_hashtags = [h.lower() for h in getattr(media, 'hashtags', [])]
-            # --- Avoid commenting on giveaways ---
+            skip_comment_reason = None
             if 'giveaway' in caption or any('giveaway' in h for h in media_hashtags) or 'giveaway' in hashtag.lower():
+                skip_comment_reason = 'giveaway'
                 logging.info(f"Skipped post {media.id} due to 'giveaway' in caption or hashtags. | Link: {post_link}")
-                if liked < like_limit and not has_action(media.id, 'like') and random.random() > 0.15:
-                    try:
-                        cl.media_like(media.id)
-                        logging.info(f"Liked post {media.id} (hashtag: {hashtag}) | Link: {post_link}")
-                        log_action('like', media_id=media.id, hashtag=hashtag, post_link=post_link)
-                        liked += 1
-                    except Exception as e:
-                        logging.error(f"Failed to like post {media.id}: {e}")
-                        log_action('error', media_id=media.id, hashtag=hashtag, error=str(e), post_link=post_link)
-                if img_path and os.path.exists(img_path):
-                    try:
-                        os.remove(img_path)
-                    except Exception as e:
-                        logging.warning(f"Could not delete image {img_path}: {e}")
-                last_action_time += next_delay()
-                time_to_wait = max(0, last_action_time - time.time())
-                if time_to_wait > 0:
-                    time.sleep(time_to_wait)
-                random_long_break()
-                continue
-            # --- Avoid commenting if avoid hashtag present ---
-            if any(h in media_hashtags for h in avoid_hashtags):
+            elif any(h in media_hashtags for h in avoid_hashtags):
+                skip_comment_reason = 'avoid_hashtag'
                 logging.info(f"Skipped commenting on post {media.id} due to avoid hashtag in hashtags. | Link: {post_link}")
-                if liked < like_limit and not has_action(media.id, 'like') and random.random() > 0.15:
-                    try:
-                        cl.media_like(media.id)
-                        logging.info(f"Liked post {media.id} (hashtag: {hashtag}) | Link: {post_link}")
-                        log_action('like', media_id=media.id, hashtag=hashtag, post_link=post_link)
-                        liked += 1
-                    except Exception as e:
-                        logging.error(f"Failed to like post {media.id}: {e}")
-                        log_action('error', media_id=media.id, hashtag=hashtag, error=str(e), post_link=post_link)
-                if img_path and os.path.exists(img_path):
-                    try:
-                        os.remove(img_path)
-                    except Exception as e:
-                        logging.warning(f"Could not delete image {img_path}: {e}")
-                last_action_time += next_delay()
-                time_to_wait = max(0, last_action_time - time.time())
-                if time_to_wait > 0:
-                    time.sleep(time_to_wait)
-                random_long_break()
+            elif media.user.pk == cl.user_id:
+                skip_comment_reason = 'own_post'
+            # --- Stage 2: duplicate checks and limits (in-memory) ---
+            want_like = liked < like_limit and not has_action(media.id, 'like')
+            want_comment = (skip_comment_reason is None and commented < comment_limit
+                            and not has_action(media.id, 'comment'))
+            if not want_like and not want_comment:
+                drops[skip_comment_reason or 'already_done'] += 1
+                if skip_comment_reason in ('giveaway', 'avoid_hashtag'):
+                    pause_after_action()
                 continue
-            # --- Like action (randomly skip some) ---
-            if liked < like_limit and not has_action(media.id, 'like') and random.random() > 0.10:
-                try:
-                    cl.media_like(media.id)
-                    logging.info(f"Liked post {media.id} (hashtag: {hashtag}) | Link: {post_link}")
-                    log_action('like', media_id=media.id, hashtag=hashtag, post_link=post_link)
-                    liked += 1
-                except Exception as e:
-                    logging.error(f"Failed to like post {media.id}: {e}")
-                    log_action('error', media_id=media.id, hashtag=hashtag, error=str(e), post_link=post_link)
-                last_action_time += next_delay()
-                time_to_wait = max(0, last_action_time - time.time())
-                if time_to_wait > 0:
-                    time.sleep(time_to_wait)
-                random_long_break()
-            # --- Comment action (randomly skip some) ---
-            if commented < comment_limit and not has_action(media.id, 'comment') and random.random() > 0.18:
+            # Only act during waking hours (else, wait until morning)
+            while not is_waking_hours():
+                logging.info("Sleeping until morning to avoid night-time bot activity.")
+                report('status', message="Sleeping until morning to avoid night-time activity...")
+                time.sleep(60 * 15)  # Sleep 15 minutes
+            # --- Like action (randomly skip some, a few more on filtered posts) ---
+            if skip_comment_reason in ('giveaway', 'avoid_hashtag'):
+                if want_like and random.random() > 0.15:
+                    like_post(media, hashtag, post_link)
+                drops[skip_comment_reason] += 1
+                pause_after_action()
+                continue
+            if want_like and random.random() > 0.10:
+                like_post(media, hashtag, post_link)
+                pause_after_action()
+            # --- Comment action (randomly skip some before paying for details/image/vision) ---
+            if not want_comment:
+                drops[skip_comment_reason or 'already_commented'] += 1
+            elif random.random() <= 0.18:
+                drops['random_skip'] += 1
+            else:
+                # --- Stage 3: expensive lookups, only for posts we will comment on ---
                 try:
-                    comment = openai_comment_fn(details, allow_sensitive=allow_sensitive)
+                    details = run_stage('details', get_media_details, cl, media)
+                    details['image_bytes'] = run_stage(
+                        'image', download_image, details.get('media_url'), media.id, image_max_dimension, image_quality
+                    )
+                    details['post_link'] = post_link
+                    comment = run_stage('generate_comment', openai_comment_fn, details, allow_sensitive=allow_sensitive)
                     if comment is None:
                         logging.info(f"Skipped commenting on post {media.id} due to sensitive image. | Link: {post_link}")
-                        last_action_time += next_delay()
-                        time_to_wait = max(0, last_action_time - time.time())
-                        if time_to_wait > 0:
-                            time.sleep(time_to_wait)
-                        random_long_break()
-                        continue
-                    cl.media_comment(media.id, comment)
-                    logging.info(f"Commented on post {media.id}: {comment} | Link: {post_link}")
-                    log_action('comment', media_id=media.id, hashtag=hashtag, comment=comment, post_link=post_link)
-                    commented += 1
+                        drops['sensitive'] += 1
+                    else:
+                        run_stage('comment', cl.media_comment, media.id, comment)
+                        logging.info(f"Commented on post {media.id}: {comment} | Link: {post_link}")
+                        log_action('comment', media_id=media.id, hashtag=hashtag, comment=comment, post_link=post_link)
+                        commented += 1
+                        report('comment', media_id=str(media.id), hashtag=hashtag, post_link=post_link)
                 except Exception as e:
                     logging.error(f"Failed to comment on post {media.id}: {e}")
                     log_action('error', media_id=media.id, hashtag=hashtag, error=str(e), post_link=post_link)
-                last_action_time += next_delay()
-                time_to_wait = max(0, last_action_time - time.time())
-                if time_to_wait > 0:
-                    time.sleep(time_to_wait)
-                random_long_break()
-            if img_path and os.path.exists(img_path):
-                try:
-                    os.remove(img_path)
-                except Exception as e:
-                    logging.warning(f"Could not delete image {img_path}: {e}")
+                    report('error', stage='comment', message=str(e))
+                pause_after_action()
             if liked >= like_limit and commented >= comment_limit:
                 break
+        logging.info(f"Posts dropped per stage so far: {dict(drops)}")
 
 if __name__ == "__main__":
     init_db()
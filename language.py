@@ -0,0 +1,118 @@
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_LANGUAGE = 'en'  # Used when a caption is too short or detection fails
+MIN_LETTERS = 8  # Captions with fewer letters (after removing hashtags, mentions, links and emoji) skip detection
+CACHE_SIZE = 4096  # Detected languages remembered, keyed by caption hash
+DETECTION_SEED = 0  # langdetect is random unless seeded
+
+# Hashtags, mentions and links say little about the caption's language
+_NOISE = re.compile(r'https?://\S+|www\.\S+|[#@][\w.]+')
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+_initialized = False
+
+def init_language_detection(seed=DETECTION_SEED):
+    """Load langdetect's language profiles and seed it. Call once at startup so the first
+    caption doesn't pay for loading the profiles and results are reproducible."""
+    global _initialized
+    with _lock:
+        if _initialized:
+            return
+        from langdetect import DetectorFactory
+        from langdetect.detector_factory import init_factory
+        DetectorFactory.seed = seed
+        init_factory()
+        _initialized = True
+
+def _caption_key(caption):
+    return hashlib.blake2b(caption.encode('utf-8', 'surrogatepass'), digest_size=8).digest()
+
+def _detect_uncached(caption):
+    text = _NOISE.sub(' ', caption)
+    if sum(ch.isalpha() for ch in text) < MIN_LETTERS:
+        return DEFAULT_LANGUAGE
+    init_language_detection()
+    from langdetect import detect
+    from langdetect.lang_detect_exception import LangDetectException
+    try:
+        return detect(text)
+    except LangDetectException:
+        return DEFAULT_LANGUAGE
+
+def detect_language(caption):
+    """Return the ISO 639-1 code of the caption's language, e.g. 'en' or 'es'"""
+    if not caption or not caption.strip():
+        return DEFAULT_LANGUAGE
+    key = _caption_key(caption)
+    with _lock:
+        language = _cache.get(key)
+        if language is not None:
+            _cache.move_to_end(key)
+            return language
+    language = _detect_uncached(caption)
+    with _lock:
+        _cache[key] = language
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return language
+
+# A few captions of the kinds the bot sees (long, short, emoji-only, hashtag-heavy, Spanish)
+SAMPLE_CAPTIONS = [
+    "Finally finished this beauty 📚✨ Couldn't put it down, what a ride! #bookstagram #reading #booklover",
+    "Domingo de lluvia, mate y un buen libro. No se puede pedir más 🧉📖 #libros #lectura",
+    "☕️📚❤️",
+    "Golden hour at the beach 🌅",
+    "Nuevo post! Link en la bio 👉 www.example.com #fotografia #buenosaires",
+    "#photography #travel #wanderlust #instagood #photooftheday",
+    "Can't believe it's already been a year since we started this little project. Thank you all for the support!",
+    "Que lindo día para salir a caminar por el parque con amigos",
+    "@friend look at this!!",
+    "",
+]
+
+def benchmark(captions=None, repeat=5):
+    """Time raw langdetect against detect_language (cold and warm cache) over captions.
+    Returns mean milliseconds per caption for each and how often the results agree."""
+    from langdetect import detect
+    from langdetect.lang_detect_exception import LangDetectException
+    captions = SAMPLE_CAPTIONS if captions is None else captions
+
+    def raw(caption):
+        try:
+            return detect(caption)
+        except LangDetectException:
+            return DEFAULT_LANGUAGE
+
+    def timed(fn, clear_cache=False):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            if clear_cache:
+                with _lock:
+                    _cache.clear()
+            for caption in captions:
+                fn(caption)
+        return (time.perf_counter() - start) * 1000 / (repeat * max(len(captions), 1))
+
+    init_language_detection()
+    results = {
+        'langdetect_ms': timed(raw),
+        'cold_ms': timed(detect_language, clear_cache=True),
+        'warm_ms': timed(detect_language),
+    }
+    results['agreement'] = sum(raw(c) == detect_language(c) for c in captions) / max(len(captions), 1)
+    return results
+
+if __name__ == "__main__":
+    # Usage: python language.py [captions.txt]  (one caption per line)
+    import sys
+    captions = None
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], encoding='utf-8') as f:
+            captions = [line.rstrip('\n') for line in f]
+    for name, value in benchmark(captions).items():
+        print(f"{name}: {value:.3f}")
@@ -3,14 +3,133 @@ from tkinter import simpledialog, messagebox, ttk
 import json
 import os
 from datetime import datetime
-from ig import login_instagram, like_and_comment
-from openai_client import set_api_key, generate_comment
+from language import init_language_detection
 from db import init_db, get_stats, log_action
-from stats import create_stats_window
-from goodreads import get_goodreads_books
 import threading
+import queue
+# ig, openai_client, goodreads and stats pull in instagrapi, openai, bs4 and
+# matplotlib/pandas; they are imported where first used so the window appears quickly
 
 CONFIG_FILE = "config.json"
+EVENT_POLL_MS = 100  # How often the Tk thread drains events posted by the bot thread
+MAX_EVENTS_PER_POLL = 200  # Events handled per poll, so a burst can't freeze the window
+
+class HashtagPills:
+    """Hashtag pills in a grid, keyed by hashtag.
+
+    sync() only creates pills for new hashtags, hides removed ones and re-grids
+    pills whose position changed. Hidden pills are pooled and reused, and each
+    pill's click and hover bindings are made once, when it is first created.
+    """
+
+    MAX_COLS = 3  # Number of pills per row before wrapping
+
+    def __init__(self, app, parent, placeholder_text, on_remove):
+        self.app = app
+        self.on_remove = on_remove
+        self.pills = {}  # hashtag -> pill, for the pills on screen
+        self.positions = {}  # hashtag -> (row, column) it is gridded at
+        self.pool = []  # Hidden pills ready for reuse
+        
+        # Show elegant placeholder when the list is empty
+        self.placeholder_frame = tk.Frame(parent, bg=app.SECONDARY_BG)
+        tk.Label(
+            self.placeholder_frame,
+            text=placeholder_text,
+            bg=app.SECONDARY_BG,
+            fg=app.TEXT_COLOR,
+            font=("SF Pro Display", 13) if app.is_macos() else ("Segoe UI", 11),
+            pady=12
+        ).pack()
+        
+        # Responsive hashtag container using grid
+        self.container = tk.Frame(parent, bg=app.SECONDARY_BG)
+        self.showing_placeholder = None
+
+    def sync(self, hashtags):
+        """Make the pills on screen match hashtags, in order"""
+        hashtags = list(dict.fromkeys(hashtags))  # One pill per hashtag
+        keep = set(hashtags)
+        for hashtag in [h for h in self.pills if h not in keep]:
+            pill = self.pills.pop(hashtag)
+            self.positions.pop(hashtag, None)
+            pill.frame.grid_forget()
+            self.pool.append(pill)
+        for i, hashtag in enumerate(hashtags):
+            pill = self.pills.get(hashtag)
+            if pill is None:
+                pill = self.pool.pop() if self.pool else self._create_pill()
+                pill.hashtag = hashtag
+                pill.label.configure(text=f"#{hashtag}")
+                self._set_hover(pill, False)
+                self.pills[hashtag] = pill
+            position = divmod(i, self.MAX_COLS)
+            if self.positions.get(hashtag) != position:
+                pill.frame.grid(row=position[0], column=position[1], padx=6, pady=4, sticky="w")
+                self.positions[hashtag] = position
+        self._show_placeholder(not hashtags)
+
+    def _show_placeholder(self, show):
+        if show == self.showing_placeholder:
+            return
+        self.showing_placeholder = show
+        if show:
+            self.container.pack_forget()
+            self.placeholder_frame.pack(fill=tk.X, pady=(16, 8))
+        else:
+            self.placeholder_frame.pack_forget()
+            self.container.pack(fill=tk.BOTH, expand=True, pady=(16, 8))
+
+    def _create_pill(self):
+        app = self.app
+        pill = _Pill()
+        pill.frame = tk.Frame(
+            self.container,
+            bg=app.INPUT_BG,
+            relief="flat",
+            bd=0,
+            highlightbackground=app.BORDER_COLOR,
+            highlightthickness=1
+        )
+        pill.label = tk.Label(
+            pill.frame,
+            bg=app.INPUT_BG,
+            fg=app.TEXT_COLOR,
+            font=("SF Pro Display", 12) if app.is_macos() else ("Segoe UI", 11),
+            padx=10,
+            pady=6,
+            wraplength=120,  # Prevents overflow, wraps long hashtags
+            anchor="w"
+        )
+        pill.label.pack(side=tk.LEFT)
+        pill.remove_btn = tk.Label(
+            pill.frame,
+            text="×",
+            bg=app.INPUT_BG,
+            fg=app.SECONDARY_TEXT,
+            font=("SF Pro Display", 16) if app.is_macos() else ("Segoe UI", 14),
+            padx=8,
+            pady=6
+        )
+        pill.remove_btn.pack(side=tk.RIGHT)
+        # The pill may be reused for another hashtag, so look it up when clicked
+        pill.remove_btn.bind("<Button-1>", lambda e: self.on_remove(pill.hashtag))
+        for widget in (pill.frame, pill.label, pill.remove_btn):
+            widget.bind("<Enter>", lambda e: self._set_hover(pill, True))
+            widget.bind("<Leave>", lambda e: self._set_hover(pill, False))
+        return pill
+
+    def _set_hover(self, pill, hover):
+        app = self.app
+        bg = app.BORDER_COLOR if hover else app.INPUT_BG
+        pill.frame.configure(bg=bg)
+        pill.label.configure(bg=bg)
+        pill.remove_btn.configure(bg=bg, fg=app.ERROR_COLOR if hover else app.SECONDARY_TEXT)
+
+class _Pill:
+    """Widgets of one hashtag pill and the hashtag it currently shows"""
+    hashtag = None
+    frame = label = remove_btn = None
 
 class InstaBotApp:
     def __init__(self, root):
@@ -38,6 +157,11 @@ class InstaBotApp:
         self.allow_sensitive_var = tk.BooleanVar(value=True)
         self.status_var = tk.StringVar(value="Ready")
         self.goodreads_user_id_var = tk.StringVar()  # Optional Goodreads user ID
+        self.goodreads_matcher = None  # Index of the Goodreads shelf, replaced when a refresh finishes
+        # The bot thread never touches Tk; it posts (kind, data) events that poll_events handles
+        self.events = queue.Queue()
+        self.action_counts = {}  # Logged actions by type, kept current from bot events
+        self.stage_timings = {}  # Stage -> (count, total seconds) for this run
         
         # Load existing config if available
         self.load_config_to_ui()
@@ -63,6 +187,9 @@ class InstaBotApp:
         # Add keyboard shortcuts
         self.setup_keyboard_shortcuts()
         
+        # Start handling events from the bot thread
+        self.root.after(EVENT_POLL_MS, self.poll_events)
+        
     def center_window(self):
         """Center the window on the screen"""
         self.root.update_idletasks()
@@ -502,32 +629,33 @@ class InstaBotApp:
         stats_frame.pack(side=tk.RIGHT)
         
         try:
-            stats = get_stats()
-            likes_count = stats.get('like', 0)
-            comments_count = stats.get('comment', 0)
+            # Read once; bot events keep the counters current after this
+            self.action_counts = get_stats()
+            likes_count = self.action_counts.get('like', 0)
+            comments_count = self.action_counts.get('comment', 0)
             
             stats_container = tk.Frame(stats_frame, bg=self.PRIMARY_BG)
             stats_container.pack(side=tk.RIGHT)
             
             # Likes stat
-            likes_label = tk.Label(
+            self.likes_label = tk.Label(
                 stats_container,
                 text=f"Likes: {likes_count}",
                 bg=self.PRIMARY_BG,
                 fg=self.ACCENT_COLOR,
                 font=("SF Pro Display", 14, "bold") if self.is_macos() else ("Segoe UI", 12, "bold")
             )
-            likes_label.pack(side=tk.LEFT, padx=(0, 16))
+            self.likes_label.pack(side=tk.LEFT, padx=(0, 16))
             
             # Comments stat
-            comments_label = tk.Label(
+            self.comments_label = tk.Label(
                 stats_container,
                 text=f"Comments: {comments_count}",
                 bg=self.PRIMARY_BG,
                 fg=self.ACCENT_COLOR,
                 font=("SF Pro Display", 14, "bold") if self.is_macos() else ("Segoe UI", 12, "bold")
             )
-            comments_label.pack(side=tk.LEFT)
+            self.comments_label.pack(side=tk.LEFT)
             
         except Exception:
             # If no stats available, show placeholder with better contrast
@@ -798,149 +926,17 @@ class InstaBotApp:
         
     def update_hashtag_display(self):
         """Update the display of hashtags with modern Instagram-like design"""
-        # Clear existing widgets
-        for widget in self.hashtag_display_frame.winfo_children():
-            widget.destroy()
-            
-        if not self.hashtags_list:
-            # Show elegant placeholder
-            placeholder_frame = tk.Frame(self.hashtag_display_frame, bg=self.SECONDARY_BG)
-            placeholder_frame.pack(fill=tk.X, pady=(16, 8))
-            
-            placeholder = tk.Label(
-                placeholder_frame,
-                text="No hashtags added yet",
-                bg=self.SECONDARY_BG,
-                fg=self.TEXT_COLOR,
-                font=("SF Pro Display", 13) if self.is_macos() else ("Segoe UI", 11),
-                pady=12
-            )
-            placeholder.pack()
-            return
-            
-        # Responsive hashtag container using grid
-        hashtag_container = tk.Frame(self.hashtag_display_frame, bg=self.SECONDARY_BG)
-        hashtag_container.pack(fill=tk.BOTH, expand=True, pady=(16, 8))
-        max_cols = 3  # Number of pills per row before wrapping
-        for i, hashtag in enumerate(self.hashtags_list):
-            pill_frame = tk.Frame(
-                hashtag_container,
-                bg=self.INPUT_BG,
-                relief="flat",
-                bd=0,
-                highlightbackground=self.BORDER_COLOR,
-                highlightthickness=1
-            )
-            pill_frame.grid(row=i // max_cols, column=i % max_cols, padx=6, pady=4, sticky="w")
-            hashtag_label = tk.Label(
-                pill_frame,
-                text=f"#{hashtag}",
-                bg=self.INPUT_BG,
-                fg=self.TEXT_COLOR,
-                font=("SF Pro Display", 12) if self.is_macos() else ("Segoe UI", 11),
-                padx=10,
-                pady=6,
-                wraplength=120,  # Prevents overflow, wraps long hashtags
-                anchor="w"
-            )
-            hashtag_label.pack(side=tk.LEFT)
-            remove_btn = tk.Label(
-                pill_frame,
-                text="×",
-                bg=self.INPUT_BG,
-                fg=self.SECONDARY_TEXT,
-                font=("SF Pro Display", 16) if self.is_macos() else ("Segoe UI", 14),
-                padx=8,
-                pady=6
-            )
-            remove_btn.pack(side=tk.RIGHT)
-            remove_btn.bind("<Button-1>", lambda e, h=hashtag: self.remove_hashtag(h))
-            def create_hover_effects(pill, label, btn, hashtag_text):
-                def on_enter(e):
-                    pill.configure(bg=self.BORDER_COLOR)
-                    label.configure(bg=self.BORDER_COLOR)
-                    btn.configure(bg=self.BORDER_COLOR, fg=self.ERROR_COLOR)
-                def on_leave(e):
-                    pill.configure(bg=self.INPUT_BG)
-                    label.configure(bg=self.INPUT_BG)
-                    btn.configure(bg=self.INPUT_BG, fg=self.SECONDARY_TEXT)
-                for widget in [pill, label, btn]:
-                    widget.bind("<Enter>", on_enter)
-                    widget.bind("<Leave>", on_leave)
-            create_hover_effects(pill_frame, hashtag_label, remove_btn, hashtag)
+        if not hasattr(self, 'hashtag_pills'):
+            self.hashtag_pills = HashtagPills(self, self.hashtag_display_frame, "No hashtags added yet", self.remove_hashtag)
+        self.hashtag_pills.sync(self.hashtags_list)
         
     def update_avoid_hashtag_display(self):
         """Update the display of avoid hashtags with modern Instagram-like design"""
-        # Clear existing widgets
-        for widget in self.avoid_hashtag_display_frame.winfo_children():
-            widget.destroy()
-            
-        if not self.avoid_hashtags_list:
-            # Show elegant placeholder
-            placeholder_frame = tk.Frame(self.avoid_hashtag_display_frame, bg=self.SECONDARY_BG)
-            placeholder_frame.pack(fill=tk.X, pady=(16, 8))
-            
-            placeholder = tk.Label(
-                placeholder_frame,
-                text="No avoid hashtags added yet",
-                bg=self.SECONDARY_BG,
-                fg=self.TEXT_COLOR,
-                font=("SF Pro Display", 13) if self.is_macos() else ("Segoe UI", 11),
-                pady=12
-            )
-            placeholder.pack()
-            return
-            
-        # Responsive hashtag container using grid
-        hashtag_container = tk.Frame(self.avoid_hashtag_display_frame, bg=self.SECONDARY_BG)
-        hashtag_container.pack(fill=tk.BOTH, expand=True, pady=(16, 8))
-        max_cols = 3  # Number of pills per row before wrapping
-        for i, hashtag in enumerate(self.avoid_hashtags_list):
-            pill_frame = tk.Frame(
-                hashtag_container,
-                bg=self.INPUT_BG,
-                relief="flat",
-                bd=0,
-                highlightbackground=self.BORDER_COLOR,
-                highlightthickness=1
-            )
-            pill_frame.grid(row=i // max_cols, column=i % max_cols, padx=6, pady=4, sticky="w")
-            hashtag_label = tk.Label(
-                pill_frame,
-                text=f"#{hashtag}",
-                bg=self.INPUT_BG,
-                fg=self.TEXT_COLOR,
-                font=("SF Pro Display", 12) if self.is_macos() else ("Segoe UI", 11),
-                padx=10,
-                pady=6,
-                wraplength=120,  # Prevents overflow, wraps long hashtags
-                anchor="w"
-            )
-            hashtag_label.pack(side=tk.LEFT)
-            remove_btn = tk.Label(
-                pill_frame,
-                text="×",
-                bg=self.INPUT_BG,
-                fg=self.SECONDARY_TEXT,
-                font=("SF Pro Display", 16) if self.is_macos() else ("Segoe UI", 14),
-                padx=8,
-                pady=6
+        if not hasattr(self, 'avoid_hashtag_pills'):
+            self.avoid_hashtag_pills = HashtagPills(
+                self, self.avoid_hashtag_display_frame, "No avoid hashtags added yet", self.remove_avoid_hashtag
             )
-            remove_btn.pack(side=tk.RIGHT)
-            remove_btn.bind("<Button-1>", lambda e, h=hashtag: self.remove_avoid_hashtag(h))
-            def create_hover_effects(pill, label, btn, hashtag_text):
-                def on_enter(e):
-                    pill.configure(bg=self.BORDER_COLOR)
-                    label.configure(bg=self.BORDER_COLOR)
-                    btn.configure(bg=self.BORDER_COLOR, fg=self.ERROR_COLOR)
-                def on_leave(e):
-                    pill.configure(bg=self.INPUT_BG)
-                    label.configure(bg=self.INPUT_BG)
-                    btn.configure(bg=self.INPUT_BG, fg=self.SECONDARY_TEXT)
-                for widget in [pill, label, btn]:
-                    widget.bind("<Enter>", on_enter)
-                    widget.bind("<Leave>", on_leave)
-            create_hover_effects(pill_frame, hashtag_label, remove_btn, hashtag)
+        self.avoid_hashtag_pills.sync(self.avoid_hashtags_list)
 
     def remove_avoid_hashtag(self, hashtag):
         """Remove an avoid hashtag from the list"""
@@ -970,20 +966,15 @@ class InstaBotApp:
         status_label.pack(side=tk.LEFT)
         info_frame = tk.Frame(status_bar, bg=self.PRIMARY_BG)
         info_frame.pack(side=tk.LEFT, padx=(30, 0))
-        try:
-            stats = get_stats()
-            total_actions = sum(stats.values())
-            info_text = f"Total actions: {total_actions}"
-        except:
-            info_text = "Total actions: 0"
-        info_label = tk.Label(
+        info_text = f"Total actions: {sum(self.action_counts.values())}"
+        self.total_actions_label = tk.Label(
             info_frame,
             text=info_text,
             bg=self.PRIMARY_BG,
             fg=self.TEXT_COLOR,  # Use TEXT_COLOR for readability
             font=("SF Pro Text", 12) if self.is_macos() else ("Segoe UI", 11)
         )
-        info_label.pack(side=tk.LEFT)
+        self.total_actions_label.pack(side=tk.LEFT)
         hashtag_info = tk.Label(
             info_frame,
             text=f" • Hashtags: {len(self.hashtags_list)}/30",
@@ -1002,6 +993,66 @@ class InstaBotApp:
             font=("SF Pro Text", 12) if self.is_macos() else ("Segoe UI", 11)
         )
         time_label.pack(side=tk.RIGHT)
+        # Average time per stage of the current run, from the bot's timing events
+        self.timing_label = tk.Label(
+            status_bar,
+            text="",
+            bg=self.PRIMARY_BG,
+            fg=self.TEXT_COLOR,
+            font=("SF Pro Text", 11) if self.is_macos() else ("Segoe UI", 10)
+        )
+        self.timing_label.pack(side=tk.RIGHT, padx=(0, 20))
+    
+    def post_event(self, kind, **data):
+        """Queue an event for the Tk thread; safe to call from any thread"""
+        self.events.put((kind, data))
+        
+    def poll_events(self):
+        """Handle events posted by worker threads (runs on the Tk thread)"""
+        for _ in range(MAX_EVENTS_PER_POLL):
+            try:
+                kind, data = self.events.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                self.handle_event(kind, data)
+            except Exception as e:
+                print(f"[WARNING] Could not handle {kind} event: {e}")
+        self.root.after(EVENT_POLL_MS, self.poll_events)
+        
+    def handle_event(self, kind, data):
+        if kind == 'status':
+            self.status_var.set(data['message'])
+        elif kind in ('like', 'comment', 'error'):
+            self.action_counts[kind] = self.action_counts.get(kind, 0) + 1
+            self.update_action_counters()
+            if kind == 'error':
+                self.status_var.set(f"Failed to {data.get('stage', 'act')}: {data.get('message', '')}")
+        elif kind == 'timing':
+            count, total = self.stage_timings.get(data['stage'], (0, 0.0))
+            self.stage_timings[data['stage']] = (count + 1, total + data['seconds'])
+            self.update_timing_display()
+        elif kind == 'done':
+            self.status_var.set("Completed! Check logs for details.")
+            messagebox.showinfo("Success", "Bot actions completed successfully!")
+        elif kind == 'failed':
+            self.status_var.set(f"Error: {data['message']}\n{data.get('traceback', '')}")
+            messagebox.showerror("Error", data['message'])
+            
+    def update_action_counters(self):
+        """Show the current like/comment/total counts in the header and status bar"""
+        if hasattr(self, 'likes_label'):
+            self.likes_label.config(text=f"Likes: {self.action_counts.get('like', 0)}")
+            self.comments_label.config(text=f"Comments: {self.action_counts.get('comment', 0)}")
+        if hasattr(self, 'total_actions_label'):
+            self.total_actions_label.config(text=f"Total actions: {sum(self.action_counts.values())}")
+            
+    def update_timing_display(self):
+        """Show average seconds per stage of the current run in the status bar"""
+        stages = ('details', 'image', 'generate_comment', 'comment')
+        parts = [f"{stage.replace('_', ' ')} {total / count:.1f}s"
+                 for stage, (count, total) in self.stage_timings.items() if stage in stages]
+        self.timing_label.config(text=" • ".join(parts))
     
     def load_config_to_ui(self):
         """Load configuration to UI with error handling"""
@@ -1029,9 +1080,20 @@ class InstaBotApp:
             self.avoid_hashtags_list = []
             self.allow_sensitive_var.set(True)
             
+    def read_config(self):
+        """Return the saved configuration, or an empty dict if there is none"""
+        try:
+            with open(CONFIG_FILE) as f:
+                return json.load(f)
+        except Exception:
+            return {}
+            
     def save_config(self, cfg):
+        # Keep settings that are only edited by hand in config.json (e.g. image tuning)
+        merged = self.read_config()
+        merged.update(cfg)
         with open(CONFIG_FILE, "w") as f:
-            json.dump(cfg, f, indent=2)
+            json.dump(merged, f, indent=2)
             
     def save_settings(self):
         """Save settings with modern validation and feedback"""
@@ -1077,45 +1139,56 @@ class InstaBotApp:
                 "goodreads_user_id": self.goodreads_user_id_var.get(),
             }
             self.save_config(cfg)
-            # Goodreads integration: scrape if user_id is provided, in background
-            goodreads_books = []
+            # Optional image tuning (config.json only): size and quality of images sent to the vision model
+            saved_cfg = self.read_config()
+            image_options = {key: int(saved_cfg[key]) for key in ('image_max_dimension', 'image_quality') if key in saved_cfg}
+            # Optional: classify, describe and comment in one OpenAI request instead of two
+            single_call = bool(saved_cfg.get('single_call_comments', False))
             user_id = self.goodreads_user_id_var.get().strip()
-            def run_bot_with_goodreads(goodreads_books):
+            def refresh_goodreads():
+                try:
+                    from goodreads import refresh_goodreads_books, BookMatcher
+                    books = refresh_goodreads_books(user_id)
+                    # Swap in the new index; the bot picks it up on its next comment
+                    self.goodreads_matcher = BookMatcher(books)
+                except Exception as e:
+                    print(f"[WARNING] Goodreads refresh failed: {e}")
+            def run_bot():
                 try:
+                    from ig import login_instagram, like_and_comment
+                    from openai_client import set_api_key, generate_comment
+                    from goodreads import load_cached_books, BookMatcher
+                    # Goodreads integration: start from the locally cached shelf (instant) and refresh it in background
+                    goodreads_books = load_cached_books(user_id) if user_id else []
+                    # Index the shelf once instead of scanning every title for every caption
+                    self.goodreads_matcher = BookMatcher(goodreads_books)
+                    if user_id:
+                        threading.Thread(target=refresh_goodreads, daemon=True).start()
                     set_api_key(cfg['openai_api_key'])
-                    self.status_var.set("Logging in to Instagram...")
-                    self.root.update()
+                    init_language_detection()
+                    self.post_event('status', message="Logging in to Instagram...")
                     cl = login_instagram(cfg['instagram_username'], cfg['instagram_password'])
-                    self.status_var.set("Running bot actions...")
-                    self.root.update()
+                    self.post_event('status', message="Running bot actions...")
                     like_and_comment(
                         cl,
                         cfg['hashtags'],
                         cfg['likes_per_day'],
                         cfg['comments_per_day'],
-                        lambda details, allow_sensitive=True: generate_comment(details, allow_sensitive=allow_sensitive, goodreads_books=goodreads_books),
+                        lambda details, allow_sensitive=True: generate_comment(
+                            details, allow_sensitive=allow_sensitive, goodreads_matcher=self.goodreads_matcher,
+                            single_call=single_call
+                        ),
                         allow_sensitive=cfg['allow_sensitive'],
-                        avoid_hashtags=cfg['avoid_hashtags']
+                        avoid_hashtags=cfg['avoid_hashtags'],
+                        progress=self.post_event,
+                        **image_options
                     )
-                    self.root.after(0, lambda: self.status_var.set("Completed! Check logs for details."))
-                    messagebox.showinfo("Success", "Bot actions completed successfully!")
+                    self.post_event('done')
                 except Exception as e:
                     import traceback
-                    error_message = f"Error: {str(e)}\n{traceback.format_exc()}"
-                    self.root.after(0, lambda msg=error_message: self.status_var.set(msg))
-                    messagebox.showerror("Error", str(e))
-            def scrape_goodreads_and_run():
-                nonlocal goodreads_books
-                if user_id:
-                    self.status_var.set("Scraping Goodreads data...")
-                    self.root.update()
-                    try:
-                        goodreads_books = get_goodreads_books(user_id) or []
-                    except Exception as e:
-                        goodreads_books = []
-                        print(f"[WARNING] Goodreads scraping failed: {e}")
-                run_bot_with_goodreads(goodreads_books)
-            threading.Thread(target=scrape_goodreads_and_run, daemon=True).start()
+                    self.post_event('failed', message=str(e), traceback=traceback.format_exc())
+            self.stage_timings = {}
+            threading.Thread(target=run_bot, daemon=True).start()
         except Exception as e:
             import traceback
             self.status_var.set(f"Error: {str(e)}\n{traceback.format_exc()}")
@@ -1124,7 +1197,8 @@ class InstaBotApp:
     def show_stats(self):
         """Open the statistics window"""
         try:
-            stats_window = create_stats_window(self.root)
+            from stats import create_stats_window  # matplotlib and pandas load on first open
+            stats_window = create_stats_window(self.root, timezone=self.read_config().get('display_timezone'))
             self.status_var.set("Viewing statistics...")
         except Exception as e:
             self.status_var.set(f"Error showing stats: {str(e)}")
@@ -1,20 +1,233 @@
 import openai
 import base64
-from langdetect import detect
+import json
+import logging
+from language import detect_language
 import random
+import threading
+import time
+from collections import deque
+from cache import vision_cache, image_hash
+from timing import timed, timed_stage
+from usage import record_usage, estimate_image_tokens
+
+REQUEST_TIMEOUT = 30  # Seconds an OpenAI request may take before it is abandoned
+CONNECT_TIMEOUT = 5  # Seconds to establish the connection
+MAX_RETRIES = 3  # Retries after a 429, 5xx, timeout or connection error
+RETRY_BACKOFF = 1.0  # Seconds before the first retry; doubles each time
+MAX_RETRY_DELAY = 20  # Upper bound on one wait, including a server's Retry-After
+LATENCY_SAMPLES = 500  # Recent request latencies kept for client_stats()
+
+_client = None
+_client_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {'requests': 0, 'retries': 0, 'failures': 0}
+_latencies = deque(maxlen=LATENCY_SAMPLES)
 
 def set_api_key(api_key):
+    """Create the client used for this run; its connection pool is shared by every request"""
+    global _client
     openai.api_key = api_key
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        # Retries are handled by chat_completion so they can be bounded, counted and logged
+        _client = openai.OpenAI(
+            api_key=api_key,
+            timeout=openai.Timeout(REQUEST_TIMEOUT, connect=CONNECT_TIMEOUT),
+            max_retries=0,
+        )
 
-def generate_comment(details, allow_sensitive=True, goodreads_books=None):
+def get_client():
+    """The run's OpenAI client, created from openai.api_key (or OPENAI_API_KEY) if needed"""
+    if _client is None:
+        set_api_key(openai.api_key)
+    return _client
+
+def client_stats():
+    """Counters for this session: requests, retries, failures and p50/p95/max latency in ms"""
+    with _stats_lock:
+        stats = dict(_stats)
+        latencies = sorted(_latencies)
+    for name, fraction in (('p50_ms', 0.5), ('p95_ms', 0.95), ('max_ms', 1.0)):
+        stats[name] = latencies[min(int(fraction * len(latencies)), len(latencies) - 1)] if latencies else None
+    return stats
+
+def _retry_delay(error, attempt):
+    """Seconds to wait before retrying error, or None if it should not be retried"""
+    if isinstance(error, openai.RateLimitError):
+        if getattr(error, 'code', None) == 'insufficient_quota':
+            return None  # Out of credit; waiting won't help
+    elif not isinstance(error, (openai.InternalServerError, openai.APIConnectionError)):
+        return None  # Other errors (bad request, auth, ...) would fail again; timeouts are connection errors
+    delay = RETRY_BACKOFF * (2 ** attempt) * random.uniform(0.5, 1.0)
+    response = getattr(error, 'response', None)
+    retry_after = response.headers.get('retry-after') if response is not None else None
+    try:
+        delay = max(delay, float(retry_after)) if retry_after else delay
+    except ValueError:
+        pass  # An HTTP date; use our own backoff
+    return min(delay, MAX_RETRY_DELAY)
+
+def chat_completion(call, ledger=None, outcome=None, **request):
+    """chat.completions.create on the run's client, retrying 429/5xx/timeouts with bounded
+    exponential backoff, and recorded in the usage ledger. ledger holds the media_id,
+    variant and image_tokens to record; outcome(response) classifies the reply (default
+    'ok'). Requests that still fail are recorded as 'error' and re-raised."""
+    ledger = ledger or {}
+    start = time.perf_counter()
+    retries = 0
+    while True:
+        try:
+            response = get_client().chat.completions.create(**request)
+            break
+        except Exception as e:
+            delay = _retry_delay(e, retries) if retries < MAX_RETRIES else None
+            if delay is None:
+                latency = time.perf_counter() - start
+                _count_request(latency, retries, failed=True)
+                record_usage(call, request['model'], latency=latency, retries=retries, outcome='error', **ledger)
+                raise
+            logging.warning(f"OpenAI {call} request failed ({e}); retry {retries + 1}/{MAX_RETRIES} in {delay:.1f}s")
+            with timed('openai_backoff'):
+                time.sleep(delay)
+            retries += 1
+    latency = time.perf_counter() - start
+    _count_request(latency, retries)
+    record_usage(call, request['model'], response, latency=latency, retries=retries,
+                 outcome=outcome(response) if outcome else 'ok', **ledger)
+    return response
+
+def _count_request(latency, retries, failed=False):
+    with _stats_lock:
+        _stats['requests'] += 1
+        _stats['retries'] += retries
+        _stats['failures'] += int(failed)
+        _latencies.append(latency * 1000)
+
+def _reply_text(response):
+    return (response.choices[0].message.content or '').strip()
+
+@timed_stage('vision_call')
+def analyze_image(image_bytes, ledger=None):
+    """Ask the vision model whether an image is safe; returns (sensitive, description)"""
+    # Already downscaled and JPEG-encoded by ig.download_image
+    img_b64 = base64.b64encode(image_bytes).decode('utf-8')
+    vision_prompt = (
+        "Analyze this Instagram image. "
+        "Is there anything harmful, offensive, graphically sexual, or NSFW in this image? "
+        "Reply with 'safe' if the image is safe, or 'sensitive' if it is not. "
+        "Then, provide a short description of the image."
+    )
+    vision_response = chat_completion(
+        'vision',
+        dict(ledger or {}, image_tokens=estimate_image_tokens(image_bytes)),
+        outcome=lambda r: 'sensitive' if _reply_text(r).lower().startswith('sensitive') else 'ok',
+        model="gpt-4o",
+        messages=[
+            {"role": "user", "content": vision_prompt},
+            {"role": "user", "content": [{"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{img_b64}"}}]}
+        ],
+        max_tokens=100,
+        temperature=0.2,
+    )
+    vision_content = vision_response.choices[0].message.content.strip()
+    sensitive = vision_content.lower().startswith('sensitive')
+    image_analysis = '\n'.join(vision_content.split('\n')[1:]).strip()
+    return sensitive, image_analysis
+
+def goodreads_prompt(caption, goodreads_matcher):
+    """Prompt lines about a book mentioned in the caption, based on the user's Goodreads shelf"""
+    return _goodreads_prompt(caption, goodreads_matcher)[0]
+
+def _goodreads_prompt(caption, goodreads_matcher):
+    # (prompt lines, variant): variant is 'none', 'unread' or 'read' for the usage ledger
+    if not goodreads_matcher or not caption:
+        return "", 'none'
+    found_book = goodreads_matcher.match(caption)
+    if not found_book:
+        # If not read, instruct not to give a false opinion
+        return "If this post is about a book I have not read, do not give a personal opinion about the book.\n", 'unread'
+    # If user has read the book, add rating/review info to prompt
+    prompt = ""
+    rating = found_book.get('rating')
+    review = found_book.get('review')
+    if rating:
+        prompt += f"I have read the book '{found_book['title']}' and gave it a {rating}/5 rating on Goodreads. "
+    if review:
+        prompt += f"My review: {review[:200]}\n"  # Limit review length
+    prompt += "If this post is a review of the book, make my comment more personal, reflecting that I have read it. Do not mention my actual rating in the comment.\n"
+    return prompt, 'read'
+
+def parse_single_call_response(content):
+    """Parse the JSON reply of a single-call request into (sensitive, description, comment).
+    Tolerates code fences and text around the object; returns None if it is unusable."""
+    if not content:
+        return None
+    text = content.strip()
+    start, end = text.find('{'), text.rfind('}')
+    if start == -1 or end <= start:
+        return None
+    try:
+        data = json.loads(text[start:end + 1])
+    except ValueError:
+        return None
+    if not isinstance(data, dict):
+        return None
+    comment = data.get('comment')
+    if not isinstance(comment, str) or not comment.strip():
+        return None
+    safe = data.get('safe')
+    if isinstance(safe, str):
+        safe = {'true': True, 'safe': True, 'yes': True, 'false': False, 'sensitive': False, 'no': False}.get(safe.strip().lower())
+    if not isinstance(safe, bool):
+        return None
+    description = data.get('description')
+    description = description.strip() if isinstance(description, str) else ''
+    return (not safe), description, comment.strip()
+
+def generate_in_one_call(prompt, image_bytes, ledger=None):
+    """Classify the image, describe it and write the comment in a single multimodal request.
+    Returns (sensitive, description, comment), or None if the reply could not be parsed."""
+    img_b64 = base64.b64encode(image_bytes).decode('utf-8')
+    prompt += (
+        "Look at the attached image of the post. Decide whether anything in it is harmful, offensive, "
+        "graphically sexual, or NSFW, describe it briefly, and let it inform the comment.\n"
+        "Respond with only a JSON object with these keys: "
+        '"safe" (true if the image is safe, false if it is sensitive), '
+        '"description" (a short description of the image) and "comment" (the Instagram comment).'
+    )
+    try:
+        with timed('single_call'):
+            response = chat_completion(
+                'single_call',
+                dict(ledger or {}, image_tokens=estimate_image_tokens(image_bytes)),
+                outcome=lambda r: 'ok' if parse_single_call_response(r.choices[0].message.content) else 'unparsed',
+                model="gpt-4o",
+                messages=[
+                    {"role": "user", "content": prompt},
+                    {"role": "user", "content": [{"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{img_b64}"}}]}
+                ],
+                max_tokens=200,
+                temperature=0.5,
+                response_format={"type": "json_object"},
+            )
+    except openai.BadRequestError as e:
+        # e.g. a model that does not support JSON mode; the two-call path still works
+        logging.warning(f"Single-call comment request rejected, falling back to two calls: {e}")
+        return None
+    result = parse_single_call_response(response.choices[0].message.content)
+    if result is None:
+        logging.warning("Could not parse single-call comment response, falling back to two calls.")
+    return result
+
+def generate_comment(details, allow_sensitive=True, goodreads_books=None, single_call=False, goodreads_matcher=None):
     # Do not comment on own posts
     if details.get('is_own_post'):
         return None
     caption = details['caption']
-    try:
-        language_code = detect(caption)
-    except Exception:
-        language_code = 'en'  # fallback
+    with timed('detect_language'):
+        language_code = detect_language(caption)
     # Alternate word limit between 10 and 20
     word_limit = random.choice([10, 20])
     prompt = (
@@ -34,63 +247,52 @@ def generate_comment(details, allow_sensitive=True, goodreads_books=None):
     else:
         prompt += ("Make the comment polite, positive, and not too familiar, as if you don't know the person. ")
     prompt += (f"The comment must be short (between 10 and {word_limit} words), and should never start with quote marks or quotation marks unless it is intentional.\n")
+    # --- Goodreads personalization ---
+    if goodreads_matcher is None and goodreads_books:
+        from goodreads import BookMatcher  # Only for this fallback; keeps goodreads (bs4, lxml) off import
+        goodreads_matcher = BookMatcher(goodreads_books)  # Callers should pass a prebuilt matcher
+    book_prompt, goodreads_variant = _goodreads_prompt(caption, goodreads_matcher)
+    # Every request for this post is recorded under the prompt variant, to compare cost per comment
+    ledger = {
+        'media_id': details.get('media_id'),
+        'variant': f"{word_limit}w+{goodreads_variant}+{'single' if single_call else 'two-call'}",
+    }
     image_analysis = None
     sensitive = False
-    if details.get('image_path'):
-        with open(details['image_path'], 'rb') as img_file:
-            img_bytes = img_file.read()
-        img_b64 = base64.b64encode(img_bytes).decode('utf-8')
-        vision_prompt = (
-            "Analyze this Instagram image. "
-            "Is there anything harmful, offensive, graphically sexual, or NSFW in this image? "
-            "Reply with 'safe' if the image is safe, or 'sensitive' if it is not. "
-            "Then, provide a short description of the image."
-        )
-        vision_response = openai.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "user", "content": vision_prompt},
-                {"role": "user", "content": [{"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{img_b64}"}}]}
-            ],
-            max_tokens=100,
-            temperature=0.2,
-        )
-        vision_content = vision_response.choices[0].message.content.strip()
-        if vision_content.lower().startswith('sensitive'):
-            sensitive = True
-        image_analysis = '\n'.join(vision_content.split('\n')[1:]).strip()
+    if details.get('image_bytes'):
+        # Reuse earlier analyses of this post, or of a visually identical image
+        img_hash = image_hash(details['image_bytes'])
+        with timed('vision_cache_lookup'):
+            cached = vision_cache.get(details.get('media_id'), img_hash)
+        if cached:
+            sensitive, image_analysis = cached['sensitive'], cached['description']
+        else:
+            result = None
+            if single_call:
+                # Classification, description and comment in one request; None means fall back
+                result = generate_in_one_call(prompt + book_prompt, details['image_bytes'], ledger)
+            if result is not None:
+                sensitive, image_analysis, comment = result
+                vision_cache.put(details.get('media_id'), img_hash, sensitive, image_analysis)
+                if sensitive and not allow_sensitive:
+                    return None  # Signal to skip commenting
+                return comment
+            sensitive, image_analysis = analyze_image(details['image_bytes'], ledger)
+            vision_cache.put(details.get('media_id'), img_hash, sensitive, image_analysis)
     if sensitive and not allow_sensitive:
         return None  # Signal to skip commenting
     if image_analysis:
         prompt += f"Image description: {image_analysis}\n"
-
-    # --- Goodreads personalization ---
-    if goodreads_books and caption:
-        # Try to find a book title in the caption (simple match)
-        found_book = None
-        for book in goodreads_books:
-            title = book.get('title', '').strip()
-            if title and title.lower() in caption.lower():
-                found_book = book
-                break
-        if found_book:
-            # If user has read the book, add rating/review info to prompt
-            rating = found_book.get('rating')
-            review = found_book.get('review')
-            if rating:
-                prompt += f"I have read the book '{found_book['title']}' and gave it a {rating}/5 rating on Goodreads. "
-            if review:
-                prompt += f"My review: {review[:200]}\n"  # Limit review length
-            prompt += "If this post is a review of the book, make my comment more personal, reflecting that I have read it. Do not mention my actual rating in the comment.\n"
-        else:
-            # If not read, instruct not to give a false opinion
-            prompt += "If this post is about a book I have not read, do not give a personal opinion about the book.\n"
+    prompt += book_prompt
 
     prompt += "Comment:"
-    response = openai.chat.completions.create(
-        model="gpt-4o",
-        messages=[{"role": "user", "content": prompt}],
-        max_tokens=60,
-        temperature=0.7,
-    )
+    with timed('comment_call'):
+        response = chat_completion(
+            'comment',
+            ledger,
+            model="gpt-4o",
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=60,
+            temperature=0.7,
+        )
     return response.choices[0].message.content.strip()
@@ -1,17 +1,53 @@
-import sqlite3
+import argparse
+import re
+import time
+from datetime import datetime
+from db import connect, init_db
 
-DB_PATH = 'instabot.db'
+TIME_FORMAT = '%Y-%m-%d %H:%M:%S'  # Local time
+_RELATIVE_TIME = re.compile(r'^(\d+)([mhdw])$')
+_UNIT_SECONDS = {'m': 60, 'h': 60 * 60, 'd': 24 * 60 * 60, 'w': 7 * 24 * 60 * 60}
 
-def print_recent_errors(limit=10):
-    conn = sqlite3.connect(DB_PATH)
+def parse_time(value):
+    """Epoch seconds for '30m', '24h', '7d', '2w' (that long ago) or an ISO date/datetime in local time"""
+    match = _RELATIVE_TIME.match(value.strip())
+    if match:
+        return int(time.time()) - int(match.group(1)) * _UNIT_SECONDS[match.group(2)]
+    try:
+        return int(datetime.fromisoformat(value.strip()).timestamp())
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid time '{value}' (use e.g. 24h, 7d or 2025-06-10)")
+
+def _format_time(ts):
+    return datetime.fromtimestamp(ts).strftime(TIME_FORMAT) if ts is not None else '?'
+
+def _time_range(column, since, until):
+    clauses, params = [], []
+    if since is not None:
+        clauses.append(f'{column} >= ?')
+        params.append(since)
+    if until is not None:
+        clauses.append(f'{column} < ?')
+        params.append(until)
+    return clauses, params
+
+def print_recent_errors(limit=10, since=None, until=None, fingerprint=None):
+    """Print the latest errors, optionally in [since, until) and of one kind (fingerprint)"""
+    clauses, params = _time_range('ts', since, until)
+    if fingerprint:
+        clauses.insert(0, 'fingerprint = ?')  # idx_actions_fingerprint_ts
+        params.insert(0, fingerprint)
+    else:
+        clauses.insert(0, "action_type = 'error'")  # idx_actions_type_ts
+    conn = connect()
     c = conn.cursor()
-    c.execute("""
-        SELECT timestamp, action_type, error
+    c.execute(f"""
+        SELECT ts, action_type, fingerprint, error
         FROM actions
-        WHERE action_type = 'error'
-        ORDER BY timestamp DESC
+        WHERE {' AND '.join(clauses)}
+        ORDER BY ts DESC
         LIMIT ?
-    """, (limit,))
+    """, params + [limit])
     errors = c.fetchall()
     conn.close()
     if not errors:
@@ -19,7 +55,55 @@ def print_recent_errors(limit=10):
     else:
         print(f"Last {len(errors)} error logs:")
         for row in errors:
-            print(f"Time: {row[0]} | Type: {row[1]} | Error: {row[2]}")
+            print(f"Time: {_format_time(row[0])} | Type: {row[1]} | Kind: {row[2]} | Error: {row[3]}")
+
+def print_error_kinds(top=10, since=None, until=None):
+    """Print the most frequent kinds of error, optionally counting only [since, until)"""
+    conn = connect()
+    c = conn.cursor()
+    if since is None and until is None:
+        # All-time counts are kept in error_kinds
+        c.execute("""
+            SELECT fingerprint, count, first_seen, last_seen, message
+            FROM error_kinds
+            ORDER BY count DESC
+            LIMIT ?
+        """, (top,))
+    else:
+        # Range scan on idx_actions_type_ts, grouped by kind
+        clauses, params = _time_range('a.ts', since, until)
+        c.execute(f"""
+            SELECT a.fingerprint, COUNT(*) AS count, MIN(a.ts), MAX(a.ts), COALESCE(k.message, MAX(a.error))
+            FROM actions a LEFT JOIN error_kinds k ON k.fingerprint = a.fingerprint
+            WHERE a.action_type = 'error' AND {' AND '.join(clauses)}
+            GROUP BY a.fingerprint
+            ORDER BY count DESC
+            LIMIT ?
+        """, params + [top])
+    kinds = c.fetchall()
+    conn.close()
+    if not kinds:
+        print("No error logs found.")
+        return
+    print(f"Top {len(kinds)} kinds of error:")
+    for fingerprint, count, first_seen, last_seen, message in kinds:
+        print(f"{count:>6} | Kind: {fingerprint} | First: {_format_time(first_seen)} | "
+              f"Last: {_format_time(last_seen)} | {message}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show errors logged by the bot.")
+    parser.add_argument('--group', action='store_true', help="group errors by kind (fingerprint), most frequent first")
+    parser.add_argument('--top', type=int, metavar='N', help="show the N most frequent kinds (implies --group)")
+    parser.add_argument('-n', '--limit', type=int, default=10, help="errors (or kinds) to show (default 10)")
+    parser.add_argument('--since', type=parse_time, help="only errors at or after this time, e.g. 24h, 7d or 2025-06-10")
+    parser.add_argument('--until', type=parse_time, help="only errors before this time")
+    parser.add_argument('--kind', metavar='FINGERPRINT', help="only errors of this kind")
+    args = parser.parse_args(argv)
+    init_db()  # Upgrades the schema (and indexes) if the bot has not run since an update
+    if args.group or args.top:
+        print_error_kinds(args.top or args.limit, args.since, args.until)
+    else:
+        print_recent_errors(args.limit, args.since, args.until, args.kind)
 
 if __name__ == "__main__":
-    print_recent_errors()
\ No newline at end of file
+    main()
@@ -7,28 +7,32 @@ Simple launcher script for the Instagram automation tool
 import sys
 import os
 import subprocess
+import importlib.util
+
+# Import name -> pip package name
+REQUIRED_PACKAGES = {
+    'instagrapi': 'instagrapi',
+    'openai': 'openai',
+    'PIL': 'Pillow',
+    'requests': 'requests',
+    'bs4': 'beautifulsoup4',
+    'langdetect': 'langdetect',
+    'pytz': 'pytz',
+    'matplotlib': 'matplotlib',
+    'pandas': 'pandas',
+    'numpy': 'numpy'
+}
+
+# Packages main.py must not import at startup (they load when the bot starts or stats open)
+LAZY_PACKAGES = ['instagrapi', 'openai', 'langdetect', 'bs4', 'lxml', 'matplotlib', 'pandas', 'numpy']
+IMPORT_TIME_BUDGET_MS = 500  # Upper bound for importing main.py
 
 def check_dependencies():
-    """Check if required packages are installed"""
-    required_packages = [
-        'instagrapi',
-        'openai', 
-        'PIL',
-        'requests',
-        'matplotlib',
-        'pandas',
-        'numpy'
-    ]
-    
+    """Check if required packages are installed (without importing them)"""
     missing_packages = []
     
-    for package in required_packages:
-        try:
-            if package == 'PIL':
-                import PIL
-            else:
-                __import__(package)
-        except ImportError:
+    for module, package in REQUIRED_PACKAGES.items():
+        if importlib.util.find_spec(module) is None:
             missing_packages.append(package)
     
     return missing_packages
@@ -42,6 +46,33 @@ def install_missing_packages(packages):
     except subprocess.CalledProcessError:
         return False
 
+def check_import_time(budget_ms=IMPORT_TIME_BUDGET_MS):
+    """Import main.py in a fresh interpreter with -X importtime. Fails if it takes longer
+    than budget_ms or loads any of LAZY_PACKAGES. Returns True if within budget."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import main'],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        print(f"❌ Importing main.py failed:\n{result.stderr[-2000:]}")
+        return False
+    # Lines look like "import time:  self [us] | cumulative | imported package"
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        parts = line[len('import time:'):].split('|')
+        try:
+            cumulative[parts[2].strip()] = int(parts[1])
+        except (IndexError, ValueError):
+            continue  # Header line
+    total_ms = cumulative.get('main', 0) / 1000
+    eager = [name for name in LAZY_PACKAGES if name in cumulative]
+    print(f"⏱️  Importing main.py took {total_ms:.0f} ms (budget {budget_ms} ms)")
+    for name in eager:
+        print(f"⚠️  {name} is imported at startup ({cumulative[name] / 1000:.0f} ms)")
+    return total_ms <= budget_ms and not eager
+
 def main():
     """Main launcher function"""
     print("🤖 InstaBot Launcher")
@@ -53,6 +84,10 @@ def main():
         print("Please run this script from the InstaBot directory.")
         sys.exit(1)
     
+    # python run.py --check-import-time: measure startup imports instead of launching
+    if '--check-import-time' in sys.argv:
+        sys.exit(0 if check_import_time() else 1)
+    
     # Check dependencies
     print("📦 Checking dependencies...")
     missing = check_dependencies()
@@ -1,51 +1,83 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 from datetime import datetime, timedelta
-import sqlite3
 import os
-import matplotlib.pyplot as plt
+import queue
+import threading
+import webbrowser
+from matplotlib.figure import Figure
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import pandas as pd
+import pytz
 import numpy as np
+from db import connect, flush_actions, get_stats, search_actions
+from cache import profile_cache
+from usage import call_cost
 
 DB_PATH = 'instabot.db'
+POLL_INTERVAL_MS = 50  # How often the window checks for data loaded by worker threads
+SEARCH_LIMIT = 100  # Results shown by the search tab
 
-def get_action_history(days=7):
-    """Get action history for the last X days"""
-    conn = sqlite3.connect(DB_PATH)
+# Instagram-inspired colors
+PRIMARY_BG = "#121212"
+TEXT_COLOR = "#f5f5f5"
+ACCENT_COLOR = "#0095f6"
+SECONDARY_BG = "#1a1a1a"
+
+def display_timezone(name=None):
+    """pytz timezone for grouping actions into dates, or None for the system's local time"""
+    if not name:
+        return None
+    try:
+        return pytz.timezone(name)
+    except pytz.UnknownTimeZoneError:
+        print(f"[WARNING] Unknown display timezone '{name}', using local time")
+        return None
+
+def _start_of_day(days, tz):
+    """Epoch of midnight X-1 days ago in tz (None for local time), so X dates including today"""
+    start = datetime.combine(datetime.now(tz).date() - timedelta(days=days - 1), datetime.min.time())
+    start = tz.localize(start) if tz else start
+    return int(start.timestamp())
+
+def get_action_history(days=7, timezone=None):
+    """Get action history for the last X days (including today), by date in timezone"""
+    tz = display_timezone(timezone)
+    start = _start_of_day(days, tz)
     
-    # Calculate date for X days ago
-    date_from = (datetime.utcnow() - timedelta(days=days)).isoformat()
+    conn = connect()
     
-    # Get actions by date and type
+    # Range scan over the 15-minute rollup buckets (kept for 90 days)
     query = """
     SELECT 
-        substr(timestamp, 1, 10) as date, 
+        bucket, 
         action_type, 
-        COUNT(*) as count 
-    FROM actions 
-    WHERE timestamp >= ? 
-    GROUP BY date, action_type
-    ORDER BY date ASC
+        count 
+    FROM action_counts 
+    WHERE bucket >= ? 
     """
     
-    df = pd.read_sql_query(query, conn, params=(date_from,))
+    df = pd.read_sql_query(query, conn, params=(start,))
     conn.close()
     
-    return df
+    # Buckets never straddle midnight, so each one belongs to a single local date
+    df['date'] = [datetime.fromtimestamp(bucket, tz).date().isoformat() for bucket in df['bucket']]
+    df = df.groupby(['date', 'action_type'], as_index=False)['count'].sum()
+    
+    return df.sort_values(['date', 'action_type'], ignore_index=True)
 
 def get_hashtag_stats():
     """Get statistics by hashtag"""
-    conn = sqlite3.connect(DB_PATH)
+    conn = connect()
     
+    # All-time totals, one row per hashtag and action type
     query = """
     SELECT 
         hashtag, 
         action_type, 
-        COUNT(*) as count 
-    FROM actions 
-    WHERE hashtag IS NOT NULL 
-    GROUP BY hashtag, action_type
+        count 
+    FROM action_totals 
+    WHERE hashtag != '' 
     ORDER BY count DESC
     """
     
@@ -54,8 +86,205 @@ def get_hashtag_stats():
     
     return df
 
-def create_stats_window(parent):
-    """Create a window displaying statistics"""
+def _style_axes(ax, title):
+    """Format a plot with Instagram-inspired styling"""
+    ax.set_facecolor(PRIMARY_BG)
+    for spine in ax.spines.values():
+        spine.set_color('#555555')
+    ax.tick_params(axis='x', colors=TEXT_COLOR)
+    ax.tick_params(axis='y', colors=TEXT_COLOR)
+    ax.set_title(title, color=TEXT_COLOR, fontsize=12)
+
+def _show_no_data(ax, text):
+    ax.text(0.5, 0.5, text,
+            horizontalalignment='center',
+            verticalalignment='center',
+            transform=ax.transAxes,
+            color=TEXT_COLOR)
+
+def fetch_activity(timezone=None):
+    """Activity pivot (dates x action types), or None if there is no data"""
+    activity_data = get_action_history(timezone=timezone)
+    if activity_data.empty:
+        return None
+    # Pivot the data to have dates as index, action_types as columns
+    return activity_data.pivot(index='date', columns='action_type', values='count').fillna(0)
+
+def draw_activity(fig, pivoted):
+    ax = fig.add_subplot(111)
+    _style_axes(ax, 'Activity History (Last 7 Days)')
+    ax.set_xlabel('Date', color=TEXT_COLOR)
+    ax.set_ylabel('Count', color=TEXT_COLOR)
+    if pivoted is None:
+        _show_no_data(ax, 'No activity data available')
+        return
+    pivoted.plot(kind='bar', ax=ax, color=['#0095f6', '#44bec7', '#ff5e3a'])
+    ax.legend(facecolor=PRIMARY_BG, labelcolor=TEXT_COLOR)
+
+def fetch_hashtags(timezone=None):
+    """Top hashtags pivot (hashtags x action types), or None if there is no data"""
+    hashtag_data = get_hashtag_stats()
+    if hashtag_data.empty:
+        return None
+    # Pivot the data to have hashtags as index, action_types as columns
+    pivoted = hashtag_data.pivot(index='hashtag', columns='action_type', values='count').fillna(0)
+    # Sort by total interactions
+    if 'like' in pivoted.columns and 'comment' in pivoted.columns:
+        pivoted['total'] = pivoted['like'] + pivoted['comment']
+        pivoted = pivoted.sort_values('total', ascending=False).head(10)
+        pivoted = pivoted.drop('total', axis=1)
+    return pivoted
+
+def draw_hashtags(fig, pivoted):
+    ax = fig.add_subplot(111)
+    _style_axes(ax, 'Hashtag Performance')
+    if pivoted is None:
+        _show_no_data(ax, 'No hashtag data available')
+        return
+    pivoted.plot(kind='barh', ax=ax, color=['#0095f6', '#44bec7'])
+    ax.legend(facecolor=PRIMARY_BG, labelcolor=TEXT_COLOR)
+
+def fetch_success(timezone=None):
+    """(success count, error count) over all logged actions"""
+    action_counts = get_stats()
+    success_count = action_counts.get('like', 0) + action_counts.get('comment', 0)
+    return success_count, action_counts.get('error', 0)
+
+def draw_success(fig, counts):
+    ax = fig.add_subplot(111)
+    ax.set_facecolor(PRIMARY_BG)
+    if sum(counts) == 0:
+        _show_no_data(ax, 'No action data available')
+        return
+    ax.pie(counts, labels=['Success', 'Errors'], colors=['#0095f6', '#ff5e3a'], autopct='%1.1f%%', startangle=90,
+           textprops={'color': TEXT_COLOR})
+    ax.set_title('Success vs Error Rate', color=TEXT_COLOR, fontsize=12)
+
+def fetch_latency(timezone=None):
+    """{percentile: dates x stages pivot} for the latency tab, or None if nothing was timed"""
+    latency = get_stage_latency(timezone=timezone)
+    if latency.empty:
+        return None
+    return {name: latency.pivot(index='date', columns='stage', values=name) for name in ('p50', 'p95', 'p99')}
+
+def draw_latency(fig, pivots):
+    if pivots is None:
+        ax = fig.add_subplot(111)
+        _style_axes(ax, 'Stage Latency (Last 7 Days)')
+        _show_no_data(ax, 'No timing data available')
+        return
+    axes = fig.subplots(len(pivots), 1, sharex=True)
+    for ax, (name, pivoted) in zip(axes, pivots.items()):
+        _style_axes(ax, '')
+        # Stages range from milliseconds (SQLite) to seconds (OpenAI)
+        pivoted.plot(ax=ax, marker='o', legend=False)
+        ax.set_yscale('log')
+        ax.set_ylabel(f'{name} (ms)', color=TEXT_COLOR)
+        ax.set_xlabel('')
+    axes[0].set_title('Stage Latency (Last 7 Days)', color=TEXT_COLOR, fontsize=12)
+    axes[0].legend(facecolor=PRIMARY_BG, labelcolor=TEXT_COLOR, fontsize=7, ncol=4)
+    axes[-1].set_xlabel('Date', color=TEXT_COLOR)
+    fig.tight_layout()
+
+def fetch_costs(timezone=None):
+    """Cost per comment by prompt variant (last 30 days), or None if nothing was recorded"""
+    costs = get_comment_costs()
+    if costs.empty:
+        return None
+    return costs
+
+def draw_costs(fig, costs):
+    ax = fig.add_subplot(111)
+    _style_axes(ax, 'OpenAI Cost per Comment (Last 30 Days)')
+    if costs is None:
+        _show_no_data(ax, 'No OpenAI usage recorded yet')
+        return
+    total = costs['cost'].sum()
+    image_share = costs['image_tokens'].sum() / max(costs['prompt_tokens'].sum(), 1)
+    ax.set_title(f'OpenAI Cost per Comment (Last 30 Days)\n${total:.2f} total • '
+                 f'~{image_share:.0%} of input tokens are images', color=TEXT_COLOR, fontsize=12)
+    costs = costs.dropna(subset=['cost_per_comment']).sort_values('cost_per_comment')
+    if costs.empty:
+        _show_no_data(ax, 'No comments generated yet')
+        return
+    cents = costs['cost_per_comment'] * 100
+    bars = ax.barh(costs['variant'], cents, color='#0095f6')
+    for bar, comments in zip(bars, costs['comments']):
+        ax.text(bar.get_width(), bar.get_y() + bar.get_height() / 2, f"  {int(comments)} comments",
+                va='center', color=TEXT_COLOR, fontsize=8)
+    ax.set_xlabel('Cents per comment (words + Goodreads + request mode)', color=TEXT_COLOR)
+    fig.tight_layout()
+
+# Notebook tabs in display order: (title, fetch, draw). fetch(timezone=...) runs on a
+# worker thread and must not touch Tk; draw(figure, data) runs on the Tk thread.
+STATS_TABS = [
+    ("Activity History", fetch_activity, draw_activity),
+    ("Hashtag Performance", fetch_hashtags, draw_hashtags),
+    ("Success Rate", fetch_success, draw_success),
+    ("Latency", fetch_latency, draw_latency),
+    ("OpenAI Cost", fetch_costs, draw_costs),
+]
+
+def register_stats_tab(title, fetch, draw):
+    """Add a tab to the statistics window (see STATS_TABS)"""
+    STATS_TABS.append((title, fetch, draw))
+
+def get_stage_latency(days=7, timezone=None):
+    """p50/p95/p99 duration in ms of each timed stage, per date in timezone, for the last X days"""
+    tz = display_timezone(timezone)
+    conn = connect()
+    df = pd.read_sql_query(
+        'SELECT ts, stage, duration_ms FROM timings WHERE ts >= ?', conn, params=(_start_of_day(days, tz),)
+    )
+    conn.close()
+    if df.empty:
+        return pd.DataFrame(columns=['date', 'stage', 'p50', 'p95', 'p99'])
+    dates = {ts: datetime.fromtimestamp(ts, tz).date().isoformat() for ts in df['ts'].unique()}
+    df['date'] = df['ts'].map(dates)
+    latency = df.groupby(['date', 'stage'])['duration_ms'].quantile([0.5, 0.95, 0.99]).unstack()
+    latency.columns = ['p50', 'p95', 'p99']
+    return latency.reset_index()
+
+def get_comment_costs(days=30):
+    """OpenAI spend per prompt variant over the last X UTC days (as OpenAI bills): cost in USD,
+    tokens, generated comments and cost per comment. Reads the daily usage rollup."""
+    date_from = (datetime.utcnow().date() - timedelta(days=days - 1)).isoformat()
+    conn = connect()
+    
+    query = """
+    SELECT 
+        model, 
+        call, 
+        variant, 
+        outcome, 
+        SUM(calls) as calls, 
+        SUM(prompt_tokens) as prompt_tokens, 
+        SUM(completion_tokens) as completion_tokens, 
+        SUM(image_tokens) as image_tokens 
+    FROM openai_usage_daily 
+    WHERE date >= ? 
+    GROUP BY model, call, variant, outcome
+    """
+    
+    df = pd.read_sql_query(query, conn, params=(date_from,))
+    conn.close()
+    
+    columns = ['variant', 'cost', 'prompt_tokens', 'completion_tokens', 'image_tokens', 'comments', 'cost_per_comment']
+    if df.empty:
+        return pd.DataFrame(columns=columns)
+    # Models missing from usage.MODEL_PRICES count as free
+    df['cost'] = [call_cost(model, prompt, completion) or 0.0
+                  for model, prompt, completion in zip(df['model'], df['prompt_tokens'], df['completion_tokens'])]
+    # A comment comes from a successful comment request or single-call request
+    generated = df[df['call'].isin(['comment', 'single_call']) & (df['outcome'] == 'ok')]
+    summary = df.groupby('variant')[['cost', 'prompt_tokens', 'completion_tokens', 'image_tokens']].sum()
+    summary['comments'] = generated.groupby('variant')['calls'].sum().reindex(summary.index).fillna(0)
+    summary['cost_per_comment'] = summary['cost'] / summary['comments'].replace(0, np.nan)
+    return summary.reset_index()[columns]
+
+def create_stats_window(parent, timezone=None):
+    """Create a window displaying statistics; dates are shown in timezone (default: local time).
+    Each tab is loaded the first time it is selected, with its data fetched off the Tk thread."""
     try:
         stats_window = tk.Toplevel(parent)
         stats_window.title("InstaBot Stats")
@@ -69,12 +298,6 @@ def create_stats_window(parent):
         # Center the window
         stats_window.geometry("+%d+%d" % (parent.winfo_rootx() + 50, parent.winfo_rooty() + 50))
         
-        # Define Instagram-inspired colors
-        PRIMARY_BG = "#121212"
-        TEXT_COLOR = "#f5f5f5"
-        ACCENT_COLOR = "#0095f6"
-        SECONDARY_BG = "#1a1a1a"
-        
         # Check if database exists and has data
         if not os.path.exists(DB_PATH):
             # Show message if no database
@@ -122,144 +345,169 @@ def create_stats_window(parent):
     style.configure("TNotebook.Tab", background=SECONDARY_BG, foreground=TEXT_COLOR, padding=[10, 5], font=("Segoe UI", 10))
     style.map("TNotebook.Tab", background=[("selected", ACCENT_COLOR)], foreground=[("selected", TEXT_COLOR)])
     
-    # Activity Tab
-    activity_frame = tk.Frame(notebook, bg=PRIMARY_BG)
-    notebook.add(activity_frame, text="Activity History")
-    
-    # Hashtags Tab
-    hashtags_frame = tk.Frame(notebook, bg=PRIMARY_BG)
-    notebook.add(hashtags_frame, text="Hashtag Performance")
-    
-    # Success Rate Tab
-    success_frame = tk.Frame(notebook, bg=PRIMARY_BG)
-    notebook.add(success_frame, text="Success Rate")
+    # One frame per registered tab, with a placeholder until its data arrives
+    tabs = {}  # notebook tab id -> (frame, fetch, draw)
+    for title, fetch, draw in STATS_TABS:
+        frame = tk.Frame(notebook, bg=PRIMARY_BG)
+        notebook.add(frame, text=title)
+        tk.Label(frame, text="Loading…", bg=PRIMARY_BG, fg=TEXT_COLOR, font=("Segoe UI", 11)).pack(expand=True)
+        tabs[str(frame)] = (frame, fetch, draw)
     
     notebook.pack(expand=True, fill="both", padx=15, pady=15)
     
-    # Create Activity History Chart
-    fig1 = plt.figure(figsize=(7, 4), facecolor=PRIMARY_BG)
-    ax1 = fig1.add_subplot(111)
-    ax1.set_facecolor(PRIMARY_BG)
-    
-    # Format the plot with Instagram-inspired styling
-    ax1.spines['bottom'].set_color('#555555')
-    ax1.spines['top'].set_color('#555555')
-    ax1.spines['left'].set_color('#555555')
-    ax1.spines['right'].set_color('#555555')
-    ax1.tick_params(axis='x', colors=TEXT_COLOR)
-    ax1.tick_params(axis='y', colors=TEXT_COLOR)
-    ax1.set_title('Activity History (Last 7 Days)', color=TEXT_COLOR, fontsize=12)
-    ax1.set_xlabel('Date', color=TEXT_COLOR)
-    ax1.set_ylabel('Count', color=TEXT_COLOR)
-    
-    # Get activity data
-    activity_data = get_action_history()
-    
-    # If we have data, plot it
-    if not activity_data.empty:
-        # Pivot the data to have dates as index, action_types as columns
-        pivoted = activity_data.pivot(index='date', columns='action_type', values='count').fillna(0)
-        
-        # Plot the data
-        pivoted.plot(kind='bar', ax=ax1, color=['#0095f6', '#44bec7', '#ff5e3a'])
-        
-        # Add legend
-        ax1.legend(facecolor=PRIMARY_BG, labelcolor=TEXT_COLOR)
-    else:
-        ax1.text(0.5, 0.5, 'No activity data available', 
-                horizontalalignment='center',
-                verticalalignment='center',
-                transform=ax1.transAxes,
-                color=TEXT_COLOR)
+    results = queue.Queue()  # (callback, data, exception) from worker threads
+    requested = set()
+    figures = []
+    pending = 0
+    poll_id = None
     
-    # Create canvas for the plot
-    canvas1 = FigureCanvasTkAgg(fig1, activity_frame)
-    canvas1.draw()
-    canvas1.get_tk_widget().pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+    def run_in_background(work, on_done):
+        """Run work() on a worker thread, then on_done(data, exception) on the Tk thread"""
+        nonlocal pending, poll_id
+        def run():
+            try:
+                flush_actions()  # Include actions the bot has queued but not yet committed
+                results.put((on_done, work(), None))
+            except Exception as e:
+                results.put((on_done, None, e))
+        threading.Thread(target=run, daemon=True).start()
+        pending += 1
+        if poll_id is None:
+            poll_id = stats_window.after(POLL_INTERVAL_MS, poll_results)
     
-    # Create Hashtag Performance Chart
-    fig2 = plt.figure(figsize=(7, 4), facecolor=PRIMARY_BG)
-    ax2 = fig2.add_subplot(111)
-    ax2.set_facecolor(PRIMARY_BG)
+    def poll_results():
+        nonlocal pending, poll_id
+        try:
+            while True:
+                try:
+                    on_done, data, error = results.get_nowait()
+                except queue.Empty:
+                    break
+                pending -= 1
+                try:
+                    on_done(data, error)
+                except Exception as e:
+                    # e.g. a chart that fails to draw: show the error in its place
+                    try:
+                        on_done(None, e)
+                    except Exception as e2:
+                        print(f"[WARNING] Could not show statistics: {e2}")
+        finally:
+            poll_id = stats_window.after(POLL_INTERVAL_MS, poll_results) if pending else None
     
-    # Format the plot with Instagram-inspired styling
-    ax2.spines['bottom'].set_color('#555555')
-    ax2.spines['top'].set_color('#555555')
-    ax2.spines['left'].set_color('#555555')
-    ax2.spines['right'].set_color('#555555')
-    ax2.tick_params(axis='x', colors=TEXT_COLOR)
-    ax2.tick_params(axis='y', colors=TEXT_COLOR)
-    ax2.set_title('Hashtag Performance', color=TEXT_COLOR, fontsize=12)
+    def load_selected_tab(event=None):
+        tab_id = notebook.select()
+        if not tab_id or tab_id in requested or tab_id not in tabs:
+            return
+        requested.add(tab_id)
+        fetch = tabs[tab_id][1]
+        run_in_background(lambda: fetch(timezone=timezone), lambda data, error: render_tab(tab_id, data, error))
     
-    # Get hashtag data
-    hashtag_data = get_hashtag_stats()
+    def render_tab(tab_id, data, error):
+        frame, fetch, draw = tabs[tab_id]
+        for child in frame.winfo_children():
+            child.destroy()
+        if error is not None:
+            tk.Label(frame, text=f"Could not load statistics:\n{error}", bg=PRIMARY_BG, fg=TEXT_COLOR,
+                     font=("Segoe UI", 11)).pack(expand=True)
+            return
+        # Figure (not pyplot) so nothing global keeps it alive after the window closes
+        fig = Figure(figsize=(7, 4), facecolor=PRIMARY_BG)
+        draw(fig, data)
+        canvas = FigureCanvasTkAgg(fig, frame)
+        canvas.draw()
+        canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        figures.append(fig)
     
-    # If we have data, plot it
-    if not hashtag_data.empty:
-        # Pivot the data to have hashtags as index, action_types as columns
-        pivoted = hashtag_data.pivot(index='hashtag', columns='action_type', values='count').fillna(0)
-        
-        # Sort by total interactions
-        if 'like' in pivoted.columns and 'comment' in pivoted.columns:
-            pivoted['total'] = pivoted['like'] + pivoted['comment']
-            pivoted = pivoted.sort_values('total', ascending=False).head(10)
-            pivoted = pivoted.drop('total', axis=1)
-        
-        # Plot the data
-        pivoted.plot(kind='barh', ax=ax2, color=['#0095f6', '#44bec7'])
-        
-        # Add legend
-        ax2.legend(facecolor=PRIMARY_BG, labelcolor=TEXT_COLOR)
-    else:
-        ax2.text(0.5, 0.5, 'No hashtag data available', 
-                horizontalalignment='center',
-                verticalalignment='center',
-                transform=ax2.transAxes,
-                color=TEXT_COLOR)
+    # Search tab: full-text search over logged comments and errors
+    search_frame = tk.Frame(notebook, bg=PRIMARY_BG)
+    notebook.add(search_frame, text="Search")
+    search_var = tk.StringVar()
+    search_type_var = tk.StringVar(value="all")
+    tz = display_timezone(timezone)
     
-    # Create canvas for the plot
-    canvas2 = FigureCanvasTkAgg(fig2, hashtags_frame)
-    canvas2.draw()
-    canvas2.get_tk_widget().pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+    def run_search(event=None):
+        text = search_var.get().strip()
+        if not text:
+            return
+        action_type = None if search_type_var.get() == "all" else search_type_var.get()
+        search_status.config(text="Searching…")
+        run_in_background(lambda: search_actions(text, limit=SEARCH_LIMIT, action_type=action_type), show_search_results)
     
-    # Create Success Rate Chart (pie chart)
-    fig3 = plt.figure(figsize=(7, 4), facecolor=PRIMARY_BG)
-    ax3 = fig3.add_subplot(111)
-    ax3.set_facecolor(PRIMARY_BG)
+    def show_search_results(rows, error):
+        results_view.delete(*results_view.get_children())
+        if error is not None:
+            search_status.config(text=f"Search failed: {error}")
+            return
+        for row in rows:
+            when = datetime.fromtimestamp(row['ts'], tz).strftime('%Y-%m-%d %H:%M') if row['ts'] else ''
+            results_view.insert('', 'end', values=(
+                when, row['action_type'], ' '.join((row['text'] or '').split()), row['post_link'] or ''
+            ))
+        search_status.config(text=f"{len(rows)} results, best matches first. Double-click a result to open the post."
+                             if rows else "No matches.")
     
-    # Calculate success rate from database
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+    def open_result(event):
+        item = results_view.focus()
+        link = results_view.set(item, 'link') if item else ''
+        if link:
+            webbrowser.open(link)
     
-    # Get total actions
-    c.execute('SELECT action_type, COUNT(*) FROM actions GROUP BY action_type')
-    action_counts = dict(c.fetchall())
-    conn.close()
+    search_bar = tk.Frame(search_frame, bg=PRIMARY_BG)
+    search_bar.pack(fill=tk.X, padx=10, pady=(10, 5))
+    search_entry = tk.Entry(search_bar, textvariable=search_var, bg=SECONDARY_BG, fg=TEXT_COLOR,
+                            insertbackground=TEXT_COLOR, relief="flat", font=("Segoe UI", 11))
+    search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, ipady=4)
+    search_entry.bind("<Return>", run_search)
+    ttk.Combobox(search_bar, textvariable=search_type_var, values=("all", "comment", "error"),
+                 state="readonly", width=9).pack(side=tk.LEFT, padx=8)
+    ttk.Button(search_bar, text="Search", command=run_search).pack(side=tk.LEFT)
+    search_status = tk.Label(search_frame, text="Search comments and errors; word* matches by prefix.",
+                             bg=PRIMARY_BG, fg=TEXT_COLOR, font=("Segoe UI", 10), anchor="w")
+    search_status.pack(fill=tk.X, padx=10)
+    style.configure("Search.Treeview", background=SECONDARY_BG, fieldbackground=SECONDARY_BG,
+                    foreground=TEXT_COLOR, rowheight=24, borderwidth=0)
+    style.configure("Search.Treeview.Heading", background=PRIMARY_BG, foreground=TEXT_COLOR)
+    results_holder = tk.Frame(search_frame, bg=PRIMARY_BG)
+    results_holder.pack(fill=tk.BOTH, expand=True, padx=10, pady=(5, 10))
+    results_view = ttk.Treeview(results_holder, columns=("time", "type", "text", "link"), show="headings",
+                                style="Search.Treeview")
+    for column, heading, width in (("time", "Time", 120), ("type", "Type", 70), ("text", "Match", 380), ("link", "Post", 160)):
+        results_view.heading(column, text=heading)
+        results_view.column(column, width=width, stretch=(column == "text"))
+    scrollbar = ttk.Scrollbar(results_holder, orient="vertical", command=results_view.yview)
+    results_view.configure(yscrollcommand=scrollbar.set)
+    scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+    results_view.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+    results_view.bind("<Double-1>", open_result)
     
-    # Define success and error counts
-    success_count = action_counts.get('like', 0) + action_counts.get('comment', 0)
-    error_count = action_counts.get('error', 0)
-    total = success_count + error_count
+    def on_destroy(event):
+        nonlocal poll_id
+        if event.widget is not stats_window:
+            return
+        if poll_id is not None:
+            stats_window.after_cancel(poll_id)
+            poll_id = None
+        for fig in figures:
+            fig.clear()
+        figures.clear()
     
-    # Plot pie chart if we have data
-    if total > 0:
-        labels = ['Success', 'Errors']
-        sizes = [success_count, error_count]
-        colors = ['#0095f6', '#ff5e3a']
-        ax3.pie(sizes, labels=labels, colors=colors, autopct='%1.1f%%', startangle=90, 
-               textprops={'color': TEXT_COLOR})
-        ax3.set_title('Success vs Error Rate', color=TEXT_COLOR, fontsize=12)
-    else:
-        ax3.text(0.5, 0.5, 'No action data available', 
-                horizontalalignment='center',
-                verticalalignment='center',
-                transform=ax3.transAxes,
-                color=TEXT_COLOR)
+    notebook.bind("<<NotebookTabChanged>>", load_selected_tab)
+    stats_window.bind("<Destroy>", on_destroy)
+    load_selected_tab()
     
-    # Create canvas for the plot
-    canvas3 = FigureCanvasTkAgg(fig3, success_frame)
-    canvas3.draw()
-    canvas3.get_tk_widget().pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+    # Author profile cache effectiveness for this session
+    profile_stats = profile_cache.stats()
+    cache_label = tk.Label(
+        stats_window,
+        text=(f"Profile cache: {profile_stats['memory_hits'] + profile_stats['db_hits']} hits "
+              f"({profile_stats['db_hits']} from disk) / {profile_stats['misses']} misses "
+              f"• {profile_stats['hit_rate']:.0%} hit rate this session"),
+        bg=PRIMARY_BG,
+        fg=TEXT_COLOR,
+        font=("Segoe UI", 10)
+    )
+    cache_label.pack(pady=(0, 5))
     
     # Add a button to close the window
     close_button = ttk.Button(
@@ -0,0 +1,46 @@
+import functools
+import time
+from contextlib import contextmanager
+from db import connect, queue_write, flush_actions, TIMING_INSERT
+
+TIMINGS_RETENTION = 30 * 24 * 60 * 60  # Seconds stage timings are kept
+
+def record_timing(stage, seconds, ok=True):
+    """Queue one stage duration for the timings table"""
+    queue_write(TIMING_INSERT, (int(time.time()), stage, seconds * 1000, int(bool(ok))))
+
+@contextmanager
+def timed(stage, on_done=None):
+    """Record how long the block takes as stage; failures are recorded with ok=0.
+    on_done(seconds, ok), if given, is called after recording."""
+    start = time.perf_counter()
+    ok = False
+    try:
+        yield
+        ok = True
+    finally:
+        seconds = time.perf_counter() - start
+        record_timing(stage, seconds, ok)
+        if on_done is not None:
+            on_done(seconds, ok)
+
+def timed_stage(stage):
+    """Decorator form of timed()"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timed(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def purge_timings(older_than=TIMINGS_RETENTION):
+    """Delete timings older than older_than seconds. Returns the number of rows removed."""
+    flush_actions()
+    conn = connect()
+    try:
+        with conn:
+            cur = conn.execute('DELETE FROM timings WHERE ts<?', (int(time.time()) - older_than,))
+        return cur.rowcount
+    finally:
+        conn.close()
@@ -0,0 +1,51 @@
+import io
+import logging
+import math
+import time
+from db import queue_write
+
+# USD per 1M (input, output) tokens; update when OpenAI changes its pricing
+MODEL_PRICES = {
+    'gpt-4o': (2.50, 10.00),
+}
+
+def call_cost(model, prompt_tokens, completion_tokens):
+    """Price in USD of a request, or None if the model is not in MODEL_PRICES"""
+    prices = MODEL_PRICES.get(model)
+    if prices is None:
+        return None
+    return ((prompt_tokens or 0) * prices[0] + (completion_tokens or 0) * prices[1]) / 1_000_000
+
+def estimate_image_tokens(image_bytes, detail='auto'):
+    """Input tokens a gpt-4o request spends on the image: 85 base plus 170 per 512px tile
+    after the image is fit in 2048x2048 and its shortest side is at most 768px"""
+    if not image_bytes:
+        return 0
+    if detail == 'low':
+        return 85
+    from PIL import Image
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        width, height = img.size
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    if min(width, height) > 768:
+        scale = 768 / min(width, height)
+        width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
+def record_usage(call, model, response=None, media_id=None, variant=None, image_tokens=0, latency=0.0, outcome='ok',
+                 retries=0):
+    """Queue one OpenAI request for the usage ledger. call is 'vision', 'comment' or 'single_call';
+    outcome is 'ok', 'error' or a call-specific result such as 'sensitive' or 'unparsed'.
+    latency covers every attempt, including retries and the waits between them."""
+    usage = getattr(response, 'usage', None)
+    prompt_tokens = getattr(usage, 'prompt_tokens', None)
+    completion_tokens = getattr(usage, 'completion_tokens', None)
+    if response is not None and usage is None:
+        logging.warning(f"OpenAI {call} response has no usage field; tokens not recorded.")
+    queue_write(
+        'INSERT INTO openai_usage (ts, media_id, call, model, variant, prompt_tokens, completion_tokens, '
+        'image_tokens, latency_ms, outcome, retries) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        (int(time.time()), None if media_id is None else str(media_id), call, model, variant,
+         prompt_tokens, completion_tokens, image_tokens, latency * 1000, outcome, retries)
+    )